@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+
+        from .authentication import invalidate_saved_user
+        from .metrics import instrument_connection
+        from .search import ensure_index_after_migrate
+        from .sqlite import apply_pragmas
+
+        post_migrate.connect(ensure_index_after_migrate, sender=self)
+        connection_created.connect(apply_pragmas)
+        connection_created.connect(instrument_connection)
+        post_save.connect(invalidate_saved_user, sender=get_user_model())
+        post_delete.connect(invalidate_saved_user, sender=get_user_model())
@@ -0,0 +1,226 @@
+"""Async versions of the hot read endpoints, used when served over ASGI.
+
+blog.urls routes these URLs here instead of blog.views when
+settings.ASYNC_READ_VIEWS is on (mysite/asgi.py turns it on). A GET is
+authenticated with AsyncJWTAuthentication, its rows, viewer state and comment
+threads are read with the async ORM, and only then do the usual serializers
+run, over objects that are fully loaded, so rendering does no I/O. Any other
+method on the same URL is handed to the sync view in blog.views.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.vary import vary_on_headers
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from . import engagement, etags, response_cache, view_counts, views
+from .authentication import AsyncJWTAuthentication
+from .metrics import TimedJSONRenderer
+from .engagement import aresolve_targets, aresolve_viewer_state
+from .fieldsets import only_requested
+from .models import Post, Comment, Like, Bookmark, Repost
+from .pagination import StandardResultsSetPagination, get_paginator
+from .search import search_posts, attach_snippets
+from .serializers import (
+    PostSerializer, CommentSerializer, LikeSerializer, BookmarkSerializer, RepostSerializer, target_querysets,
+)
+from .threads import aload_threads
+
+SAFE_METHODS = ("GET", "HEAD")
+
+_authenticator = AsyncJWTAuthentication()
+
+
+def _render(data, status=200, cache_kind=None):
+    response = HttpResponse(TimedJSONRenderer().render(data), status=status, content_type="application/json")
+    if cache_kind:
+        response["X-Cache"] = cache_kind.upper()
+    return response
+
+
+def _render_exception(exc):
+    """The body and status DRF's exception handler would produce."""
+    if isinstance(exc, Http404):
+        return _render({"detail": str(exc) or "Not found."}, status=404)
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = _render(data, status=exc.status_code)
+    if exc.status_code == 401:
+        response["WWW-Authenticate"] = _authenticator.authenticate_header(None)
+    return response
+
+
+def read_view(sync_view, etag_func=None):
+    """Serve GET/HEAD with the decorated coroutine, everything else with
+    `sync_view`.
+
+    The coroutine receives a DRF Request with the user already resolved, so
+    shared helpers (paginators, serializer context) work unchanged. Like
+    @condition on the sync views, a matching If-None-Match is answered with
+    304 before the view runs.
+    """
+    def decorator(view):
+        @csrf_exempt  # as @api_view does; JWT requests carry no CSRF token
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+            etag = None
+            if etag_func is not None:
+                etag = await sync_to_async(etag_func)(request, *args, **kwargs)
+                if etag:
+                    etag = quote_etag(etag)
+                    not_modified = get_conditional_response(request, etag=etag)
+                    if not_modified is not None:
+                        return not_modified
+
+            try:
+                drf_request = Request(request, authenticators=())
+                drf_request.user = await _authenticator.aauthenticate(request)
+                response = await view(drf_request, *args, **kwargs)
+            except (APIException, Http404) as exc:
+                return _render_exception(exc)
+            if etag and response.status_code == 200:
+                response.headers.setdefault("ETag", etag)
+            return response
+        return wrapper
+    return decorator
+
+
+#################################################
+# POSTS
+#################################################
+async def _post_list_data(request):
+    posts = Post.objects.all().select_related("author").prefetch_related("tags")
+
+    # --- Filtering ---
+    author = request.query_params.get("author")
+    search = request.query_params.get("search")
+
+    if author:
+        posts = posts.filter(author__id=author)
+    if search:
+        posts = search_posts(posts, search)
+    context = {"request": request}
+    posts = only_requested(posts, PostSerializer, context, extra=["created_at"])
+
+    # --- Pagination ---
+    if search:
+        paginator = StandardResultsSetPagination()
+    else:
+        paginator = get_paginator(request, ordering=("-created_at", "-id"))
+    paginated_posts = await paginator.apaginate_queryset(posts, request)
+    if search:
+        paginated_posts = await sync_to_async(attach_snippets)(paginated_posts, search)
+    serializer = PostSerializer(paginated_posts, many=True, context=context)
+    if serializer.child.wants_viewer_state():
+        await aresolve_viewer_state(context, Post, paginated_posts)
+    return paginator.get_paginated_response(serializer.data).data
+
+
+@vary_on_headers("Authorization")
+@read_view(views.post_list_create, etag_func=etags.post_list_etag)
+async def post_list_create(request):
+    if not response_cache.is_cached_list_page(request):
+        return _render(await _post_list_data(request))
+    data, kind = await response_cache.acached_data(
+        request, "post-list", [response_cache.POSTS_SCOPE], lambda: _post_list_data(request),
+    )
+    return _render(data, cache_kind=kind)
+
+
+@view_counts.counts_view
+@vary_on_headers("Authorization")
+@read_view(views.post_detail, etag_func=etags.post_detail_etag)
+async def post_detail(request, pk):
+    async def build():
+        post = await aget_object_or_404(Post.objects.select_related("author").prefetch_related("tags"), pk=pk)
+        context = {"request": request}
+        await aresolve_viewer_state(context, Post, [post])
+        return PostSerializer(post, context=context).data
+
+    data, kind = await response_cache.acached_data(request, "post-detail", [response_cache.post_scope(pk)], build)
+    return _render(data, cache_kind=kind)
+
+
+############## COMMENTS #####################
+
+@vary_on_headers("Authorization")
+@read_view(views.comment_list_create, etag_func=etags.comment_list_etag)
+async def comment_list_create(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related("author", "parent")
+
+    # --- Filtering ---
+    author = request.query_params.get("author")
+    if author:
+        comments = comments.filter(author__id=author)
+    context = {"request": request}
+    comments = only_requested(comments, CommentSerializer, context, extra=views.COMMENT_THREAD_COLUMNS)
+
+    # --- Pagination ---
+    paginator = get_paginator(request, ordering=("created_at", "id"))
+    paginated_comments = await aload_threads(await paginator.apaginate_queryset(comments, request))
+    serializer = CommentSerializer(paginated_comments, many=True, context=context)
+    if serializer.child.wants_viewer_state():
+        # Replies are attached already, so this walks whole threads without queries.
+        objects = list(serializer.child.viewer_state_objects(paginated_comments))
+        await aresolve_viewer_state(context, Comment, objects)
+    return _render(paginator.get_paginated_response(serializer.data).data)
+
+
+#################################################
+# ENGAGEMENT LISTS
+#################################################
+async def _engagement_page(request, rows, serializer_class):
+    context = {"request": request}
+    rows = only_requested(rows, serializer_class, context, extra=["created"])
+    paginator = get_paginator(request, ordering=("-created", "-id"))
+    paginated = await paginator.apaginate_queryset(rows, request)
+    serializer = serializer_class(paginated, many=True, context=context)
+    if serializer.child.wants_targets():
+        await aresolve_targets(context, paginated, target_querysets())
+    return _render(paginator.get_paginated_response(serializer.data).data)
+
+
+@read_view(views.like_list)
+async def like_list(request):
+    likes = Like.objects.all().select_related("user")
+
+    # --- Filtering ---
+    user = request.query_params.get("user")
+    content_type = request.query_params.get("type")  # "post" or "comment"
+    object_id = request.query_params.get("object_id")
+
+    if user:
+        likes = likes.filter(user__id=user)
+    if content_type and object_id:
+        likes = engagement.of_target(likes, content_type, object_id)
+
+    return await _engagement_page(request, likes, LikeSerializer)
+
+
+@read_view(views.bookmark_list)
+async def bookmark_list(request):
+    bookmarks = Bookmark.objects.all().select_related("user")
+
+    user = request.query_params.get("user")
+    if user:
+        bookmarks = bookmarks.filter(user__id=user)
+
+    return await _engagement_page(request, bookmarks, BookmarkSerializer)
+
+
+@read_view(views.repost_list)
+async def repost_list(request):
+    reposts = Repost.objects.all().select_related("user")
+
+    user = request.query_params.get("user")
+    if user:
+        reposts = reposts.filter(user__id=user)
+
+    return await _engagement_page(request, reposts, RepostSerializer)
@@ -0,0 +1,319 @@
+"""JWT authentication with a cached user lookup.
+
+Every authenticated request used to load its User row. CachedJWTAuthentication
+resolves the token's user through two cache levels instead: a small LRU in
+process memory, kept for a few seconds (JWT_USER_LOCAL_CACHE_TIMEOUT), in front
+of the shared cache backend named by JWT_USER_CACHE, kept for
+JWT_USER_CACHE_TIMEOUT. Saving or deleting a user, which is also how a
+password change is stored, drops both entries in this process and the shared
+one for all of them; other processes' LRUs catch up within their short
+timeout. The active and revoked-token checks still run on every request.
+
+JWT_USER_CACHE has to name a cache every worker shares: with a per-process
+one, the other workers would keep a saved user, password hash and is_active
+included, for the whole JWT_USER_CACHE_TIMEOUT. Settings leave it unset
+unless BLOG_CACHE_BACKEND is a shared backend.
+
+Read-only endpoints that only need to know who is asking can use
+ClaimsJWTAuthentication: on GET and HEAD the view gets a claims user (see
+claims_user) built from the token, and the token is checked against the
+user's auth state alone: whether they are active and a marker of their
+password, cached like the user but without loading the row. Writes resolve
+the real user as above. JWT_CLAIMS_USER_ON_READS turns that off everywhere.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+#################################################
+# USER CACHE
+#################################################
+class LocalUserCache:
+    """Per-process LRU of user id -> (expiry, value)."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, user):
+        size = settings.JWT_USER_LOCAL_CACHE_SIZE
+        if not size:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + settings.JWT_USER_LOCAL_CACHE_TIMEOUT, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_users = LocalUserCache()
+local_auth_states = LocalUserCache()  # see auth_state()
+
+
+def _shared_cache():
+    alias = settings.JWT_USER_CACHE
+    return caches[alias] if alias is not None else None
+
+
+def _cache_key(user_id):
+    return f"authuser:{user_id}"
+
+
+def _state_key(user_id):
+    return f"authstate:{user_id}"
+
+
+def _lookup(user_id):
+    return {api_settings.USER_ID_FIELD: user_id}
+
+
+def _forget(user_id):
+    local_users.discard(user_id)
+    local_auth_states.discard(user_id)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([_cache_key(user_id), _state_key(user_id)])
+
+
+def invalidate_user(user_id):
+    """Drop the cached copies of a user; call it after writing the row with
+    queryset.update(), which sends no signal. Dropped again on commit, so a
+    request that read the old row meanwhile cannot leave it cached."""
+    _forget(user_id)
+    transaction.on_commit(lambda: _forget(user_id))
+
+
+def invalidate_saved_user(sender, instance, **kwargs):
+    """post_save / post_delete receiver for the user model."""
+    invalidate_user(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+def _cached(local, key, user_id, load):
+    value = local.get(user_id)
+    if value is None:
+        shared = _shared_cache()
+        value = shared.get(key) if shared is not None else None
+        if value is None:
+            value = load()
+            if shared is not None:
+                shared.set(key, value, settings.JWT_USER_CACHE_TIMEOUT)
+        local.set(user_id, value)
+    return value
+
+
+async def _acached(local, key, user_id, aload):
+    value = local.get(user_id)
+    if value is None:
+        shared = _shared_cache()
+        value = await shared.aget(key) if shared is not None else None
+        if value is None:
+            value = await aload()
+            if shared is not None:
+                await shared.aset(key, value, settings.JWT_USER_CACHE_TIMEOUT)
+        local.set(user_id, value)
+    return value
+
+
+def cached_user(user_id):
+    """The user with this id, from the caches when possible. Each call gets
+    its own copy, so a request can never change another one's user."""
+    users = get_user_model().objects
+    return copy.copy(_cached(local_users, _cache_key(user_id), user_id, lambda: users.get(**_lookup(user_id))))
+
+
+async def acached_user(user_id):
+    users = get_user_model().objects
+    return copy.copy(await _acached(local_users, _cache_key(user_id), user_id, lambda: users.aget(**_lookup(user_id))))
+
+
+def _state_of(row):
+    if row is None:
+        raise get_user_model().DoesNotExist
+    is_active, password = row
+    return is_active, get_md5_hash_password(password)
+
+
+def _state_query(user_id):
+    return get_user_model().objects.filter(**_lookup(user_id)).values_list("is_active", "password")
+
+
+def auth_state(user_id):
+    """(is_active, password marker) of a user: all a token check needs. The
+    marker is what simplejwt puts in the revoke claim, never the hash itself."""
+    return _cached(local_auth_states, _state_key(user_id), user_id, lambda: _state_of(_state_query(user_id).first()))
+
+
+async def aauth_state(user_id):
+    async def load():
+        return _state_of(await _state_query(user_id).afirst())
+
+    return await _acached(local_auth_states, _state_key(user_id), user_id, load)
+
+
+def token_user_id(validated_token):
+    """The token's user id, as the model field's type: tokens carry it as a
+    string, while saved users and the cache keys use the field's own value."""
+    try:
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        return get_user_model()._meta.get_field(api_settings.USER_ID_FIELD).to_python(user_id)
+    except (KeyError, ValidationError) as e:
+        raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+
+class ClaimsUserWriteError(RuntimeError):
+    """Raised when something tries to save or delete a claims user."""
+
+
+def _read_only(*args, **kwargs):
+    raise ClaimsUserWriteError("A claims user has no loaded row to write; resolve the real user first.")
+
+
+def claims_user(validated_token):
+    """An unsaved user carrying nothing but the token's user id.
+
+    It compares equal to the real user and filters the ORM like one, which is
+    all viewer state and the "mine" lists need, but every other field has its
+    model default, so it must never be saved or checked for flags such as
+    is_staff. Check the token against auth_state() before handing one out.
+    """
+    user = get_user_model()(**_lookup(token_user_id(validated_token)))
+    user._state.adding = False
+    user.save = user.delete = _read_only
+    return user
+
+
+#################################################
+# AUTHENTICATION CLASSES
+#################################################
+def _user_not_found():
+    return AuthenticationFailed(_("User not found"), code="user_not_found")
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that resolves users through the user cache."""
+
+    # Build a claims user instead of resolving one on GET and HEAD.
+    claims_on_reads = False
+
+    def uses_claims(self, request):
+        return self.claims_on_reads and settings.JWT_CLAIMS_USER_ON_READS and request.method in SAFE_METHODS
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if self.uses_claims(request):
+            return self.get_claims_user(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def check_state(self, is_active, password_marker, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_marker:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+    def check_user(self, user, validated_token):
+        self.check_state(user.is_active, get_md5_hash_password(user.password), validated_token)
+        return user
+
+    def get_user(self, validated_token):
+        try:
+            user = cached_user(token_user_id(validated_token))
+        except get_user_model().DoesNotExist as e:
+            raise _user_not_found() from e
+        return self.check_user(user, validated_token)
+
+    def get_claims_user(self, validated_token):
+        try:
+            state = auth_state(token_user_id(validated_token))
+        except get_user_model().DoesNotExist as e:
+            raise _user_not_found() from e
+        self.check_state(*state, validated_token)
+        return claims_user(validated_token)
+
+
+class ClaimsJWTAuthentication(CachedJWTAuthentication):
+    """For endpoints whose reads only need the viewer's id."""
+
+    claims_on_reads = True
+
+
+class AsyncJWTAuthentication(ClaimsJWTAuthentication):
+    """ClaimsJWTAuthentication for async views.
+
+    Decoding and validating the token is pure computation and is reused as is;
+    only the user lookup can touch the database, and it goes through the async
+    ORM and cache APIs so the event loop is never blocked.
+    """
+
+    async def aauthenticate(self, request):
+        """The requesting user, or AnonymousUser when no token was sent.
+
+        Raises the same AuthenticationFailed / InvalidToken errors as
+        authenticate().
+        """
+        header = self.get_header(request)
+        if header is None:
+            return AnonymousUser()
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return AnonymousUser()
+        validated_token = self.get_validated_token(raw_token)
+        if self.uses_claims(request):
+            return await self.aget_claims_user(validated_token)
+        return await self.aget_user(validated_token)
+
+    async def aget_user(self, validated_token):
+        try:
+            user = await acached_user(token_user_id(validated_token))
+        except get_user_model().DoesNotExist as e:
+            raise _user_not_found() from e
+        return self.check_user(user, validated_token)
+
+    async def aget_claims_user(self, validated_token):
+        try:
+            state = await aauth_state(token_user_id(validated_token))
+        except get_user_model().DoesNotExist as e:
+            raise _user_not_found() from e
+        self.check_state(*state, validated_token)
+        return claims_user(validated_token)
@@ -0,0 +1,188 @@
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.test.utils import setup_databases, teardown_databases
+
+# A small vocabulary sampled with Zipf-like weights, so generated text has a
+# few very common words and a long tail of rare ones.
+WORDS = (
+    "the of and to in is it that for on with as was at by this be from or an are not "
+    "django python sqlite index query cache cursor thread comment post feed timeline "
+    "search latency throughput benchmark replica router counter snippet token session "
+    "async worker shard migration schema vacuum journal pragma bookmark repost like "
+    "follower trending velocity decay engagement payload serializer middleware histogram"
+).split()
+WEIGHTS = [1 / rank for rank in range(1, len(WORDS) + 1)]
+
+
+def sentence(rng, length):
+    return " ".join(rng.choices(WORDS, weights=WEIGHTS, k=length))
+
+
+@contextmanager
+def scratch_databases(verbosity=0):
+    """Run the block against throwaway test databases, never the real ones."""
+    old_config = setup_databases(verbosity=verbosity, interactive=False, serialized_aliases=set())
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def make_rng(seed):
+    return random.Random(seed)
+
+
+def _bulk(model, rows, batch_size):
+    """bulk_create an iterable of unsaved instances, one transaction per batch."""
+    rows = iter(rows)
+    created = 0
+    while batch := list(islice(rows, batch_size)):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def _popularity(rng, count, total, cap):
+    """Split `total` events over `count` targets with a Zipf-like skew, at
+    most `cap` per target."""
+    weights = [1 / (rank ** 0.8) for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    scale = total / sum(weights)
+    return [min(cap, round(weight * scale)) for weight in weights]
+
+
+# Sizes of the seed_dataset() defaults, as exposed by the commands that seed.
+DATASET_DEFAULTS = {
+    "users": 1000, "posts": 20_000, "tags": 200, "tags_per_post": 3, "commented_posts": 500,
+    "comments_per_post": 100, "max_depth": 10, "likes": 1_000_000, "bookmarks": 50_000, "reposts": 50_000,
+    "follows": 50,
+}
+
+
+def add_dataset_arguments(parser):
+    group = parser.add_argument_group("dataset")
+    for name, default in DATASET_DEFAULTS.items():
+        group.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+    group.add_argument("--seed", type=int, default=42)
+    group.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk insert and transaction.")
+
+
+def seed_dataset(rng, users=1000, posts=20_000, tags=200, tags_per_post=3, commented_posts=500,
+                 comments_per_post=100, max_depth=10, likes=1_000_000, bookmarks=50_000, reposts=50_000,
+                 follows=50, batch_size=5000, username_prefix="bench", drop_indexes=True,
+                 log=lambda message: None):
+    """Add a synthetic dataset to the current database using bulk inserts.
+
+    Engagement follows a Zipf-like skew and replies mostly answer the latest
+    comments, which grows deep chains. Indexes are rebuilt after the inserts
+    (see blog.bulk_load), then counters, comment paths and the timeline of
+    the first new user are filled in as the app itself would. Returns that
+    user, who follows `follows` others, plus the ids the benchmarks need.
+    """
+    from . import counters, timeline
+    from .bulk_load import deferred_maintenance
+    from .models import Bookmark, Comment, Engagement, Follow, Like, Post, Repost, Tag, User, make_excerpt
+    from .tags import PostTag
+    from .trending import update_scores
+
+    def new_ids(model, after):
+        return list(model.objects.filter(pk__gt=after).order_by("pk").values_list("pk", flat=True))
+
+    last_user = User.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    last_post = Post.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    loaded = [User, Post, Comment, Engagement]
+    with deferred_maintenance(loaded, drop_indexes=drop_indexes):
+        password = make_password("bench")
+        _bulk(User, (User(username=f"{username_prefix}{i}", password=password) for i in range(users)), batch_size)
+        user_ids = new_ids(User, last_user)
+        log(f"{users} users")
+
+        contents = (sentence(rng, 80) for _ in range(posts))
+        _bulk(Post, (
+            Post(
+                author_id=rng.choice(user_ids), title=sentence(rng, 6), content=content,
+                excerpt=make_excerpt(content),
+            )
+            for content in contents
+        ), batch_size)
+        post_ids = new_ids(Post, last_post)
+        log(f"{posts} posts")
+
+        Tag.objects.bulk_create([Tag(name=f"topic{i}") for i in range(tags)], ignore_conflicts=True)
+        tag_ids = list(Tag.objects.values_list("pk", flat=True))
+        _bulk(PostTag, (
+            PostTag(post_id=post_id, tag_id=tag_id)
+            for post_id in post_ids
+            for tag_id in rng.sample(tag_ids, min(tags_per_post, len(tag_ids)))
+        ), batch_size)
+        log(f"{len(post_ids) * tags_per_post} tag links")
+
+        # Paths are built here, as Comment.save() would, from explicitly assigned ids.
+        next_id = (Comment.objects.order_by("-pk").values_list("pk", flat=True).first() or 0) + 1
+        comments = []
+        for post_id in rng.sample(post_ids, min(commented_posts, len(post_ids))):
+            thread = []
+            for _ in range(comments_per_post):
+                # Mostly reply to one of the latest comments, which grows deep chains.
+                parent = rng.choice(thread[-5:]) if thread and rng.random() < 0.7 else None
+                if parent is not None and parent.depth >= max_depth:
+                    parent = None
+                comment = Comment(
+                    id=next_id, post_id=post_id, author_id=rng.choice(user_ids), content=sentence(rng, 20),
+                    parent=parent, depth=parent.depth + 1 if parent else 0,
+                    path=(parent.path if parent else "") + Comment.path_segment(next_id),
+                )
+                next_id += 1
+                thread.append(comment)
+            comments.extend(thread)
+        _bulk(Comment, comments, batch_size)
+        log(f"{len(comments)} comments")
+
+        for model, total in ((Like, likes), (Bookmark, bookmarks), (Repost, reposts)):
+            per_post = _popularity(rng, len(post_ids), total, cap=len(user_ids))
+            created = _bulk(model, (
+                model(
+                    user_id=user_id, kind=model.proxy_kind, target_type=Engagement.TargetType.POST,
+                    target_id=post_id,
+                )
+                for post_id, count in zip(post_ids, per_post)
+                for user_id in rng.sample(user_ids, count)
+            ), batch_size)
+            log(f"{created} {model._meta.verbose_name_plural}")
+    log("indexes rebuilt")
+
+    for model in (Post, Comment):
+        counters.rebuild_counters(model, chunk_size=batch_size)
+
+    viewer = User.objects.get(pk=user_ids[0])
+    followed = rng.sample(user_ids[1:], min(follows, len(user_ids) - 1))
+    Follow.objects.bulk_create([Follow(follower=viewer, following_id=pk) for pk in followed])
+    User.objects.filter(pk=viewer.pk).update(following_count=len(followed))
+    User.objects.filter(pk__in=followed).update(followers_count=1)
+    for followed_user in User.objects.filter(pk__in=followed):
+        timeline.backfill_follow(viewer, followed_user)
+    update_scores(batch_size)
+    log("counters, timeline and trending scores")
+
+    viewer.refresh_from_db()
+    # A post with a comment thread, that thread's root comment, and a user
+    # the viewer does not follow yet.
+    ids = {"post": comments[0].post_id, "comment": comments[0].id} if comments else {"post": post_ids[0]}
+    followed = set(followed)
+    return viewer, {**ids, "user": next((pk for pk in user_ids[1:] if pk not in followed), None)}
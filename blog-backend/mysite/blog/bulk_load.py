@@ -0,0 +1,207 @@
+"""Bulk loading: JSONL imports and the synthetic data generator.
+
+Rows go in through batched bulk_create, one transaction per batch, with
+everything derived from them left until the end. While loading, the tables'
+secondary indexes and the full-text triggers are dropped
+(deferred_maintenance), then rebuilt once. Afterwards finish_load()
+recomputes counters, comment paths and trending scores from the loaded rows.
+
+The JSONL rows use the column names of the NDJSON exports in blog.export, so
+an export can be imported into another environment as-is. Primary keys are
+kept, except for likes, reposts and bookmarks: nothing refers to those, and
+exports from before they shared one table reuse ids across kinds. Stored
+counters in the input are ignored and recomputed.
+"""
+import json
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, LPad
+from django.utils import timezone
+
+from . import counters, response_cache, search, trending
+from .models import User, Post, Comment, Engagement, Like, Repost, Bookmark, Tag, make_excerpt
+from .tags import PostTag, normalize_tags
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@contextmanager
+def deferred_maintenance(models, using=DEFAULT_DB_ALIAS, drop_indexes=True):
+    """Drop the Meta.indexes of `models`, and the full-text triggers if posts
+    are among them, for the duration of the block; then rebuild both.
+
+    Unique constraints stay, since conflict-ignoring inserts rely on them.
+    """
+    connection = connections[using]
+    editor = connection.schema_editor()  # only used to render SQL
+    models = list(dict.fromkeys(model._meta.concrete_model for model in models))  # proxies share their table
+    indexes = [(model, index) for model in models for index in model._meta.indexes] if drop_indexes else []
+    with connection.cursor() as cursor:
+        for model, index in indexes:
+            cursor.execute(f"DROP INDEX IF EXISTS {connection.ops.quote_name(index.name)}")
+        if Post in models and search.is_supported(connection):
+            for name in search.TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for model, index in indexes:
+                cursor.execute(str(index.create_sql(model, editor)))
+        search.ensure_index(connection)  # restores the triggers and re-reads every post
+
+
+def _timestamp_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+
+
+@contextmanager
+def _given_timestamps(model):
+    """Let bulk_create keep the timestamps in the input instead of stamping
+    auto_now/auto_now_add fields with the current time."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in _timestamp_fields(model)]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _instance(model, row, columns):
+    values = {column: row[column] for column in columns if column in row}
+    for field in _timestamp_fields(model):
+        values[field.attname] = values.get(field.attname) or timezone.now()
+    return model(**values)
+
+
+def _load(model, instances, batch_size, after_batch=None, ignore_conflicts=False):
+    """bulk_create `instances` in transactions of `batch_size` rows; returns
+    the number of rows sent."""
+    loaded = 0
+    with _given_timestamps(model):
+        for batch in _batches(instances, batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=ignore_conflicts)
+                if after_batch is not None:
+                    after_batch(batch)
+            loaded += len(batch)
+    return loaded
+
+
+#################################################
+# LOADERS
+#################################################
+USER_COLUMNS = ["id", "username", "full_name", "email", "bio", "phone_number", "avatar_url", "date_joined",
+                "password"]
+POST_COLUMNS = ["id", "author_id", "title", "content", "excerpt", "created_at", "updated_at", "original_post_id",
+                "views_count"]
+COMMENT_COLUMNS = ["id", "post_id", "author_id", "parent_id", "content", "created_at"]
+ENGAGEMENT_COLUMNS = ["user_id", "kind", "target_type", "target_id", "created"]
+
+
+def load_users(rows, batch_size):
+    unusable = make_password(None)  # exports carry no password hashes
+
+    def user(row):
+        instance = _instance(User, row, USER_COLUMNS)
+        instance.password = instance.password or unusable
+        return instance
+
+    return _load(User, (user(row) for row in rows), batch_size)
+
+
+def load_posts(rows, batch_size):
+    tag_ids = dict(Tag.objects.values_list("name", "id"))
+
+    def post(row):
+        instance = _instance(Post, row, POST_COLUMNS)
+        instance.excerpt = instance.excerpt or make_excerpt(instance.content)
+        instance.tag_names = normalize_tags(row.get("tags") or [])
+        return instance
+
+    def link_tags(posts):
+        names = {name for post in posts for name in post.tag_names} - tag_ids.keys()
+        if names:
+            Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+            tag_ids.update(Tag.objects.filter(name__in=names).values_list("name", "id"))
+        PostTag.objects.bulk_create([
+            PostTag(post_id=post.pk, tag_id=tag_ids[name]) for post in posts for name in post.tag_names
+        ], ignore_conflicts=True)
+
+    return _load(Post, (post(row) for row in rows), batch_size, after_batch=link_tags)
+
+
+def load_comments(rows, batch_size):
+    # Paths and depths are filled in by finish_load(), once every parent exists.
+    return _load(Comment, (_instance(Comment, row, COMMENT_COLUMNS) for row in rows), batch_size)
+
+
+def _engagement_loader(model):
+    def load(rows, batch_size):
+        target_types = {label: value for value, label in Engagement.TargetType.choices}
+
+        def engagement(row):
+            row = {
+                **row, "kind": model.proxy_kind, "target_type": target_types[row["target_type"]],
+                "target_id": row["object_id"],
+            }
+            return _instance(model, row, ENGAGEMENT_COLUMNS)
+
+        return _load(model, (engagement(row) for row in rows), batch_size, ignore_conflicts=True)
+    return load
+
+
+# In dependency order: each kind only refers to the kinds before it.
+LOADERS = {
+    "users": (User, load_users),
+    "posts": (Post, load_posts),
+    "comments": (Comment, load_comments),
+    "likes": (Like, _engagement_loader(Like)),
+    "reposts": (Repost, _engagement_loader(Repost)),
+    "bookmarks": (Bookmark, _engagement_loader(Bookmark)),
+}
+
+
+def fill_comment_paths():
+    """Set path and depth on comments that have none, one tree level per
+    UPDATE. Returns the number of comments updated."""
+    segment = Concat(LPad(Cast("id", CharField()), 10, Value("0")), Value("/"))
+    updated = Comment.objects.filter(path="", parent__isnull=True).update(path=segment, depth=0)
+    parents = Comment.objects.filter(pk=OuterRef("parent_id"))
+    while True:
+        level = Comment.objects.filter(path="", parent__isnull=False).exclude(parent__path="").update(
+            path=Concat(Subquery(parents.values("path")), segment),
+            depth=Subquery(parents.values("depth")) + 1,
+        )
+        if not level:
+            return updated
+        updated += level
+
+
+def finish_load(batch_size):
+    """Recompute everything derived from the loaded rows."""
+    fill_comment_paths()
+    for model in (Post, Comment):
+        counters.rebuild_counters(model, chunk_size=batch_size)
+    trending.update_scores(batch_size)
+    response_cache.invalidate_lists()
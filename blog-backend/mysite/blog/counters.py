@@ -0,0 +1,64 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Post, Comment, Engagement
+
+
+# Counter field -> engagement kind it counts.
+ENGAGEMENT_COUNTERS = {
+    "likes_count": Engagement.Kind.LIKE,
+    "reposts_count": Engagement.Kind.REPOST,
+    "bookmarks_count": Engagement.Kind.BOOKMARK,
+}
+
+
+def adjust_counter(model, pk, field, delta):
+    """Atomically add `delta` to a stored counter with a single UPDATE."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def _count_subquery(queryset, key):
+    counts = (
+        queryset.filter(**{key: OuterRef("pk")})
+        .order_by()
+        .values(key)
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def counter_expressions(model):
+    """Correlated COUNT subqueries that recompute every counter on `model`."""
+    target_type = Engagement.target_type_for(model)
+    expressions = {
+        field: _count_subquery(Engagement.objects.filter(kind=kind, target_type=target_type), "target_id")
+        for field, kind in ENGAGEMENT_COUNTERS.items()
+    }
+    if model is Post:
+        expressions["comments_count"] = _count_subquery(Comment.objects.all(), "post")
+    return expressions
+
+
+def recount(model, pks, fields):
+    """Recompute `fields` for the rows `pks` from the source rows in one UPDATE."""
+    expressions = counter_expressions(model)
+    model.objects.filter(pk__in=pks).update(**{field: expressions[field] for field in fields})
+
+
+def rebuild_counters(model, chunk_size=1000):
+    """Recompute the stored counters of `model` from the source rows.
+
+    Works through primary-key ranges so each UPDATE touches at most
+    `chunk_size` rows. Returns the number of rows updated.
+    """
+    expressions = counter_expressions(model)
+    ids = model.objects.order_by("pk").values_list("pk", flat=True)
+    updated = 0
+    last_pk = 0
+    while True:
+        chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return updated
+        updated += model.objects.filter(pk__gte=chunk[0], pk__lte=chunk[-1]).update(**expressions)
+        last_pk = chunk[-1]
@@ -0,0 +1,247 @@
+"""Likes, bookmarks and reposts: viewer state and the set-state engine.
+
+Every engagement write goes through set_states(). It takes the desired end
+state for each (action, target) rather than a toggle, so replaying or racing
+the same request is harmless: rows are inserted with INSERT OR IGNORE and
+removed with one set-based DELETE per group, and the stored counters of every
+touched target are recomputed from the source rows in the same transaction.
+
+All three kinds live in the one Engagement table (Like, Bookmark and Repost
+are per-kind proxies of it), addressed by target type and id, so viewer state
+for every kind is a single indexed query.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import response_cache, timeline
+from .counters import recount
+from .models import Engagement, Like, Bookmark, Repost, Post, Comment
+
+# action -> (engagement model, counter field on the target)
+ACTIONS = {
+    "like": (Like, "likes_count"),
+    "bookmark": (Bookmark, "bookmarks_count"),
+    "repost": (Repost, "reposts_count"),
+}
+
+TARGETS = {
+    "post": Post,
+    "comment": Comment,
+}
+
+# Target type name, as in URLs and request bodies -> stored value.
+TARGET_TYPES = {label: value for value, label in Engagement.TargetType.choices}
+
+# Engagement kind -> viewer-state flag.
+VIEWER_STATE_FLAGS = {
+    Engagement.Kind.LIKE: "liked",
+    Engagement.Kind.BOOKMARK: "bookmarked",
+    Engagement.Kind.REPOST: "reposted",
+}
+
+
+class UnknownTargets(Exception):
+    def __init__(self, missing):
+        super().__init__(f"Unknown targets: {missing}")
+        self.missing = missing
+
+
+def get_row(user, action, target_type, target_id):
+    """The user's engagement row for one target, or None."""
+    source = ACTIONS[action][0]
+    return source.objects.filter(user=user, target_type=TARGET_TYPES[target_type], target_id=target_id).first()
+
+
+def of_target(queryset, target_type, target_id):
+    """`queryset` narrowed to the rows about one target, given by type name;
+    empty for an unknown type."""
+    if target_type not in TARGET_TYPES:
+        return queryset.none()
+    return queryset.filter(target_type=TARGET_TYPES[target_type], target_id=target_id)
+
+
+def set_states(user, operations):
+    """Apply `operations`, an iterable of (action, target_type, target_id,
+    state) tuples, in one transaction.
+
+    Later operations on the same (action, target) win. Raises UnknownTargets
+    if any target does not exist. Returns {(action, target_type, target_id):
+    (state, count)} with the target's counter after the change.
+    """
+    wanted = {}
+    for action, target_type, target_id, state in operations:
+        wanted[(action, target_type, target_id)] = bool(state)
+
+    groups = defaultdict(lambda: ([], []))  # (action, target_type) -> (on, off)
+    for (action, target_type, target_id), state in wanted.items():
+        groups[(action, target_type)][0 if state else 1].append(target_id)
+
+    results = {}
+    with transaction.atomic():
+        targets = _load_targets(wanted)
+        for (action, target_type), (on, off) in groups.items():
+            source, field = ACTIONS[action]
+            model = TARGETS[target_type]
+            stored_type = TARGET_TYPES[target_type]
+            mine = source.objects.filter(user=user, target_type=stored_type)
+
+            added = set(on) - set(mine.filter(target_id__in=on).values_list("target_id", flat=True))
+            source.objects.bulk_create([
+                source(user=user, kind=source.proxy_kind, target_type=stored_type, target_id=pk) for pk in on
+            ], ignore_conflicts=True)
+            mine.filter(target_id__in=off).delete()
+
+            touched = on + off
+            recount(model, touched, [field])
+            counts = dict(model.objects.filter(pk__in=touched).values_list("pk", field))
+            for pk in on:
+                results[(action, target_type, pk)] = (True, counts[pk])
+            for pk in off:
+                results[(action, target_type, pk)] = (False, counts[pk])
+
+            _after_change(user, action, target_type, [targets[target_type][pk] for pk in touched], added, off)
+    return results
+
+
+def set_state(user, action, target_type, target_id, state):
+    return set_states(user, [(action, target_type, target_id, state)])[(action, target_type, target_id)]
+
+
+def _load_targets(wanted):
+    ids = defaultdict(set)
+    for _, target_type, target_id in wanted:
+        ids[target_type].add(target_id)
+    targets = {}
+    missing = []
+    for target_type, pks in ids.items():
+        model = TARGETS[target_type]
+        fields = ["id", "post_id"] if model is Comment else ["id"]
+        targets[target_type] = model.objects.only(*fields).in_bulk(pks)
+        missing += [(target_type, pk) for pk in sorted(pks - targets[target_type].keys())]
+    if missing:
+        raise UnknownTargets(missing)
+    return targets
+
+
+def _after_change(user, action, target_type, objects, added, removed):
+    for obj in objects:
+        response_cache.invalidate_post(obj.pk if target_type == "post" else obj.post_id)
+    if action == "repost" and target_type == "post":
+        now = timezone.now()
+        for obj in objects:
+            if obj.pk in added:
+                timeline.fan_out(obj, user, now, is_repost=True)
+            elif obj.pk in removed:
+                timeline.retract_repost(obj, user)
+
+
+def _viewer_state_query(user, model, ids):
+    return Engagement.objects.filter(
+        user=user, target_type=Engagement.target_type_for(model), target_id__in=ids,
+    ).values_list("kind", "target_id")
+
+
+def _by_flag(rows):
+    state = {flag: set() for flag in VIEWER_STATE_FLAGS.values()}
+    for kind, target_id in rows:
+        state[VIEWER_STATE_FLAGS[kind]].add(target_id)
+    return state
+
+
+def viewer_state(user, model, ids):
+    """Which of `ids` (objects of `model`) `user` has liked, bookmarked and
+    reposted: one `target_id__in` query for all three kinds, answered from the
+    (user, target_type, target_id, kind) unique index."""
+    ids = list(ids)
+    if not ids:
+        return _by_flag([])
+    return _by_flag(_viewer_state_query(user, model, ids))
+
+
+async def aviewer_state(user, model, ids):
+    """viewer_state() for async views."""
+    ids = list(ids)
+    if not ids:
+        return _by_flag([])
+    return _by_flag([row async for row in _viewer_state_query(user, model, ids)])
+
+
+def _unresolved(context, model, objects):
+    """(resolved state, ids still to look up) for `objects`, or None when
+    there is no viewer."""
+    request = context.get("request")
+    if request is None or not request.user.is_authenticated:
+        return None
+    resolved = context.setdefault("viewer_state", {}).setdefault(
+        model, {"ids": set(), **_by_flag([])},
+    )
+    return resolved, {obj.pk for obj in objects} - resolved["ids"]
+
+
+def _merge_viewer_state(resolved, ids, state):
+    for flag, found in state.items():
+        resolved[flag] |= found
+    resolved["ids"] |= ids
+
+
+def resolve_viewer_state(context, model, objects):
+    """Resolve viewer state for `objects` into the serializer `context`.
+
+    Objects already resolved earlier in the same serialization are skipped, so
+    nested serializers over the same rows cost nothing.
+    """
+    pending = _unresolved(context, model, objects)
+    if pending and pending[1]:
+        resolved, missing = pending
+        _merge_viewer_state(resolved, missing, viewer_state(context["request"].user, model, missing))
+
+
+async def aresolve_viewer_state(context, model, objects):
+    """resolve_viewer_state() for async views, which resolve everything up
+    front so serializing afterwards runs no queries."""
+    pending = _unresolved(context, model, objects)
+    if pending and pending[1]:
+        resolved, missing = pending
+        _merge_viewer_state(resolved, missing, await aviewer_state(context["request"].user, model, missing))
+
+
+def has_engaged(context, model, obj, flag):
+    resolved = context.get("viewer_state", {}).get(model)
+    return resolved is not None and obj.pk in resolved[flag]
+
+
+#################################################
+# TARGETS (?include=target)
+#################################################
+def _unresolved_targets(context, rows):
+    resolved = context.setdefault("targets", {})
+    missing = defaultdict(set)
+    for row in rows:
+        if (row.target_type, row.target_id) not in resolved:
+            missing[row.target_type].add(row.target_id)
+    return resolved, missing
+
+
+def resolve_targets(context, rows, querysets):
+    """Load the posts and comments engagement `rows` point at into the
+    serializer `context`: one in_bulk() of `querysets[target_type]` per
+    target type on the page, whatever its size. Deleted targets resolve to
+    None."""
+    resolved, missing = _unresolved_targets(context, rows)
+    for target_type, ids in missing.items():
+        found = querysets[target_type].in_bulk(ids)
+        resolved.update({(target_type, pk): found.get(pk) for pk in ids})
+
+
+async def aresolve_targets(context, rows, querysets):
+    """resolve_targets() for async views."""
+    resolved, missing = _unresolved_targets(context, rows)
+    for target_type, ids in missing.items():
+        found = await querysets[target_type].ain_bulk(ids)
+        resolved.update({(target_type, pk): found.get(pk) for pk in ids})
+
+
+def resolved_target(context, row):
+    return context.get("targets", {}).get((row.target_type, row.target_id))
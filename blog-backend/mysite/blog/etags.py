@@ -0,0 +1,58 @@
+"""ETag functions for django.views.decorators.http.condition.
+
+Each tag is derived from the response cache versions (blog.response_cache),
+which are bumped whenever a post, its comments or its engagement change, plus
+`updated_at` where the row has one. Computing one costs at most a single
+indexed lookup and never serializes the body, so a matching If-None-Match is
+answered with 304 before the view runs.
+
+Post view counts change without any of those: the detail tag also covers the
+stored views_count, so it changes each time pending views are flushed (see
+blog.view_counts), and views still pending in a worker can lag behind until
+then. List tags leave view counts out, like the response cache does.
+"""
+import hashlib
+
+from .models import Comment, Post
+from .response_cache import POSTS_SCOPE, post_scope, versions
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def _tag(request, *parts):
+    # The full path covers filters and pagination parameters; the credentials
+    # cover the per-viewer is_liked / is_bookmarked / is_reposted fields.
+    credentials = request.META.get("HTTP_AUTHORIZATION", "")
+    raw = "|".join(str(part) for part in (*parts, request.get_full_path(), credentials))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def post_list_etag(request):
+    if request.method not in SAFE_METHODS:
+        return None
+    return _tag(request, "post-list", *versions(POSTS_SCOPE))
+
+
+def post_detail_etag(request, pk):
+    if request.method not in SAFE_METHODS:
+        return None
+    row = Post.objects.filter(pk=pk).values_list("updated_at", "views_count").first()
+    if row is None:
+        return None
+    updated_at, views_count = row
+    return _tag(request, "post", pk, updated_at.isoformat(), views_count, *versions(post_scope(pk)))
+
+
+def comment_list_etag(request, post_id):
+    if request.method not in SAFE_METHODS:
+        return None
+    return _tag(request, "comments", post_id, *versions(post_scope(post_id)))
+
+
+def comment_detail_etag(request, pk):
+    if request.method not in SAFE_METHODS:
+        return None
+    post_id = Comment.objects.filter(pk=pk).values_list("post_id", flat=True).first()
+    if post_id is None:
+        return None
+    return _tag(request, "comment", pk, *versions(post_scope(post_id)))
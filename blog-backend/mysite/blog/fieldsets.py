@@ -0,0 +1,100 @@
+"""Sparse fieldsets for the post, comment and engagement serializers.
+
+On GET requests, `?fields=id,title,author` keeps only those fields of each
+post, comment or engagement row (the id is always kept), and unknown names are
+ignored. Lists are rendered in list mode: authors and engagement users use the
+compact AuthorSerializer, and posts carry their `excerpt` instead of the
+`content`. `?expand=author` (or `user`) and `?expand=content` bring the full
+forms back. Detail endpoints are never in list mode.
+
+only_requested() then narrows a list queryset to the columns those fields
+read, so neither the post bodies nor the users' profiles are loaded for
+nothing.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def requested(request, param):
+    """The comma-separated names in query parameter `param`, or None when it
+    is absent or the request is not a read."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    raw = request.query_params.get(param)
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(",") if name.strip()}
+
+
+class SparseFieldsMixin:
+    # Nested user fields and the compact serializer they use in list mode.
+    compact_fields = {}
+    # Fields left out of list mode unless expanded or asked for by name.
+    list_omit = ()
+    # Columns read by fields that have no column of their own.
+    field_columns = {}
+    # Names accepted in ?fields= for a field of another name.
+    field_aliases = {}
+
+    def is_list_mode(self):
+        # Decided once per render by the outermost serializer, so nested
+        # serializers (comment replies) follow the page they are part of.
+        return self.context.setdefault("list_mode", isinstance(self.root, serializers.ListSerializer))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        wanted = requested(request, "fields")
+        expand = requested(request, "expand") or set()
+        if wanted is not None:
+            wanted = {self.field_aliases.get(name, name) for name in wanted} | {"id"}
+
+        if self.is_list_mode():
+            for name, compact in self.compact_fields.items():
+                if name in fields and name not in expand:
+                    fields[name] = compact(read_only=True)
+            for name in self.list_omit:
+                if name not in expand and not (wanted and name in wanted):
+                    fields.pop(name, None)
+        if wanted is not None:
+            fields = {name: field for name, field in fields.items() if field.write_only or name in wanted}
+        return fields
+
+
+def only_requested(queryset, serializer_class, context, extra=()):
+    """Restrict `queryset` to the columns a list of `serializer_class` will
+    read with this request's fieldset, plus the `extra` ones (pagination and
+    thread keys). Relations that nothing reads any more are not joined."""
+    child = serializer_class(many=True, context=context).child
+    model = queryset.model
+    field_columns = getattr(child, "field_columns", {})  # serializers without the mixin have none
+    columns, joined = {"pk", *extra}, set()
+    for name, field in child.fields.items():
+        if field.write_only:
+            continue
+        if name in field_columns:
+            columns.update(field_columns[name])
+        elif isinstance(field, serializers.BaseSerializer):
+            joined.add(field.source)
+            columns.update(
+                f"{field.source}__{nested.source}" for nested in field.fields.values()
+                if not nested.write_only and "." not in nested.source and nested.source != "*"
+            )
+        elif field.source != "*" and "." not in field.source:
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(field.source)
+
+    related = queryset.query.select_related
+    if isinstance(related, dict):
+        # select_related() of a relation that only() defers is an error.
+        kept = [name for name in related if name in joined or name in columns]
+        queryset = queryset.select_related(None)
+        if kept:
+            queryset = queryset.select_related(*kept)
+    return queryset.only(*columns)
@@ -0,0 +1,239 @@
+import json
+import statistics
+import time
+from contextlib import ExitStack
+from itertools import count
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from blog import engagement, urls, view_counts
+from blog.benchmarking import DATASET_DEFAULTS, add_dataset_arguments, make_rng, scratch_databases, seed_dataset
+from blog.models import Post, User
+
+DATASET_OPTIONS = (*DATASET_DEFAULTS, "seed")
+
+
+def cases(ids):
+    """(name, URL name, method, URL kwargs, query string, body, cleanup) for
+    every benchmarked request. The body may be a function of the repetition
+    number; cleanup(client, response) undoes a write outside the timing."""
+    post, comment, user = ids["post"], ids["comment"], ids["user"]
+    serial = count()
+
+    def delete_post(client, response):
+        Post.objects.filter(pk=response.json()["id"]).delete()
+
+    def delete_comment(client, response):
+        client.delete(f"/blog/comments/{response.json()['id']}/")
+
+    def repeat(client, response):
+        client.generic(response.request["REQUEST_METHOD"], response.request["PATH_INFO"])
+
+    def unset(action):
+        def cleanup(client, response):
+            engagement.set_state(response.wsgi_request.user, action, "comment", comment, False)
+        return cleanup
+
+    def unfollow(client, response):
+        client.delete(f"/blog/users/{user}/follow/")
+
+    def undo_batch(client, response):
+        client.post("/blog/engagements/batch/", batch(False), content_type="application/json")
+
+    def batch(state):
+        return {"operations": [
+            {"action": action, "target_type": "post", "target_id": post, "state": state}
+            for action in ("like", "bookmark", "repost")
+        ]}
+
+    def delete_user(client, response):
+        User.objects.filter(username__startswith="bench-signup-").delete()
+
+    return [
+        ("post list", "post-list-create", "GET", {}, "", None, None),
+        ("post list, page 50", "post-list-create", "GET", {}, "page=50", None, None),
+        ("post list, cursor", "post-list-create", "GET", {}, "pagination=cursor", None, None),
+        ("post list, author", "post-list-create", "GET", {}, f"author={user}", None, None),
+        ("post search", "post-list-create", "GET", {}, "search=cache+index", None, None),
+        ("create post", "post-list-create", "POST", {}, "", {"title": "Bench", "content": "x", "tags": ["bench"]},
+         delete_post),
+        ("post detail", "post-detail", "GET", {"pk": post}, "", None, None),
+        ("post page", "post-page", "GET", {"pk": post}, "", None, None),
+        ("like post", "post-like", "POST", {"pk": post}, "", None, repeat),
+        ("bookmark post", "post-bookmark", "POST", {"pk": post}, "", None, repeat),
+        ("repost post", "post-repost", "POST", {"pk": post}, "", None, repeat),
+        ("comment list", "comment-list-create", "GET", {"post_id": post}, "", None, None),
+        ("create comment", "comment-list-create", "POST", {"post_id": post}, "", {"content": "bench"},
+         delete_comment),
+        ("comment detail", "comment-detail", "GET", {"pk": comment}, "", None, None),
+        ("like comment", "comment-like", "POST", {"pk": comment}, "", None, unset("like")),
+        ("bookmark comment", "comment-bookmark", "POST", {"pk": comment}, "", None, unset("bookmark")),
+        ("repost comment", "comment-repost", "POST", {"pk": comment}, "", None, unset("repost")),
+        ("like list", "like-list", "GET", {}, "", None, None),
+        ("likes of a post", "like-list", "GET", {}, f"type=post&object_id={post}&pagination=cursor", None, None),
+        ("bookmark list", "bookmark-list", "GET", {}, "", None, None),
+        ("bookmarks, targets", "bookmark-list", "GET", {}, "include=target", None, None),
+        ("repost list", "repost-list", "GET", {}, "", None, None),
+        ("engagement batch", "engagement-batch", "POST", {}, "", batch(True), undo_batch),
+        ("follow", "user-follow", "POST", {"pk": user}, "", None, unfollow),
+        ("home timeline", "home-timeline", "GET", {}, "", None, None),
+        ("trending posts", "trending-posts", "GET", {}, "", None, None),
+        ("trending tags", "trending-tags", "GET", {}, "", None, None),
+        ("export posts", "export", "GET", {"kind": "posts"}, "", None, None),
+        ("export likes", "export", "GET", {"kind": "likes"}, "", None, None),
+        ("register", "register", "POST", {}, "",
+         lambda i: {"username": f"bench-signup-{next(serial)}", "password": "bench-pass"}, delete_user),
+        ("current user", "current-user", "GET", {}, "", None, None),
+        ("sign in", "signin", "POST", {}, "", {"username": "bench0", "password": "bench"}, None),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset in a scratch database, time every route in "
+        "blog/urls.py through the test client and compare query counts, wall "
+        "time and response sizes against a JSON baseline."
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per request; the median is kept.")
+        parser.add_argument("--only", action="append", help="Only run cases whose name contains this (repeatable).")
+        parser.add_argument("--baseline", default="bench_baseline.json", help="Baseline file to compare against.")
+        parser.add_argument(
+            "--update-baseline", action="store_true",
+            help="Write this run's results to --baseline instead of comparing.",
+        )
+        parser.add_argument(
+            "--time-threshold", type=float, default=0.25,
+            help="Fail when a median time grows by more than this fraction (default 0.25).",
+        )
+        parser.add_argument(
+            "--min-time-delta", type=float, default=2.0,
+            help="Ignore time growth below this many milliseconds, which is noise (default 2).",
+        )
+        parser.add_argument(
+            "--query-threshold", type=int, default=0,
+            help="Fail when a request runs more than this many extra queries (default 0).",
+        )
+        parser.add_argument(
+            "--size-threshold", type=float, default=0.10,
+            help="Fail when a response grows by more than this fraction (default 0.10).",
+        )
+
+    def handle(self, *args, **options):
+        dataset = {name: options[name] for name in DATASET_OPTIONS}
+        baseline_path = Path(options["baseline"])
+        baseline = None
+        if not options["update_baseline"]:
+            if not baseline_path.exists():
+                raise CommandError(f"No baseline at {baseline_path}; run once with --update-baseline.")
+            baseline = json.loads(baseline_path.read_text())
+            if baseline["dataset"] != dataset:
+                raise CommandError(
+                    f"{baseline_path} was recorded for a different dataset: {baseline['dataset']}"
+                )
+
+        setup_test_environment()  # allows the "testserver" host
+        try:
+            # Views are counted but never flushed, so nothing outlives the scratch database.
+            with scratch_databases(), override_settings(VIEW_COUNT_FLUSH_INTERVAL=None):
+                results = self.run_cases(dataset, options)
+        finally:
+            view_counts.counter.pending.drain()
+            teardown_test_environment()
+
+        if options["update_baseline"]:
+            baseline_path.write_text(json.dumps({"dataset": dataset, "endpoints": results}, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+            return
+
+        regressions = self.compare(baseline["endpoints"], results, options)
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def run_cases(self, dataset, options):
+        rng = make_rng(dataset["seed"])
+        seed_options = {name: value for name, value in dataset.items() if name != "seed"}
+        viewer, ids = seed_dataset(
+            rng, batch_size=options["batch_size"], log=lambda message: self.stdout.write(f"seeded {message}"),
+            **seed_options,
+        )
+        User.objects.filter(pk=viewer.pk).update(is_staff=True)  # for the exports
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(viewer).access_token}")
+
+        all_cases = cases(ids)
+        covered = {case[1] for case in all_cases}
+        missing = [pattern.name for pattern in urls.urlpatterns if pattern.name not in covered]
+        if missing:
+            raise CommandError(f"No benchmark case for routes: {', '.join(missing)}")
+
+        self.stdout.write(f"{'case':<22} {'method':<6} {'status':>6} {'queries':>8} {'ms':>9} {'bytes':>9}")
+        results = {}
+        for name, route, method, kwargs, query, body, cleanup in all_cases:
+            if options["only"] and not any(part in name for part in options["only"]):
+                continue
+            path = reverse(route, kwargs=kwargs) + (f"?{query}" if query else "")
+            result = self.measure(client, method, path, body, cleanup, options["repeat"])
+            results[name] = result
+            self.stdout.write(
+                f"{name:<22} {method:<6} {result['status']:>6} {result['queries']:>8} "
+                f"{result['ms']:>9.1f} {result['bytes']:>9}"
+            )
+        return results
+
+    def measure(self, client, method, path, body, cleanup, repeat):
+        timings, queries = [], []
+        for i in range(repeat + 1):  # the first run warms up and is not kept
+            data = body(i) if callable(body) else body
+            cache.clear()  # time the database path, not response-cache hits
+            with ExitStack() as stack:
+                captured = [stack.enter_context(CaptureQueriesContext(conn)) for conn in connections.all()]
+                start = time.perf_counter()
+                response = client.generic(
+                    method, path, json.dumps(data) if data is not None else "", content_type="application/json",
+                )
+                content = b"".join(response) if response.streaming else response.content
+                elapsed = (time.perf_counter() - start) * 1000
+            if i:
+                timings.append(elapsed)
+                queries.append(sum(len(context) for context in captured))
+            if cleanup is not None:
+                cleanup(client, response)
+            view_counts.counter.pending.drain()
+        return {
+            "method": method,
+            "path": path,
+            "status": response.status_code,
+            "queries": max(queries),
+            "ms": round(statistics.median(timings), 2),
+            "bytes": len(content),
+        }
+
+    def compare(self, baseline, results, options):
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                self.stdout.write(self.style.WARNING(f"{name}: not in the baseline"))
+                continue
+            if result["status"] != before["status"]:
+                regressions.append(f"{name}: status {before['status']} -> {result['status']}")
+            if result["queries"] > before["queries"] + options["query_threshold"]:
+                regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+            grown = result["ms"] - before["ms"]
+            if grown > options["min_time_delta"] and grown > before["ms"] * options["time_threshold"]:
+                regressions.append(f"{name}: {before['ms']:.1f} -> {result['ms']:.1f} ms")
+            if result["bytes"] > before["bytes"] * (1 + options["size_threshold"]):
+                regressions.append(f"{name}: {before['bytes']} -> {result['bytes']} bytes")
+        return regressions
@@ -0,0 +1,100 @@
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ["/blog/posts/", "/blog/posts/1/", "/blog/posts/1/comments/", "/blog/likes/"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent GET throughput of running WSGI and ASGI servers. "
+        "Start the same project twice against the same database, e.g. "
+        "`gunicorn mysite.wsgi -w 1 --threads 8 -b :8000` and "
+        "`uvicorn mysite.asgi:application --port 8001` (mysite/asgi.py enables "
+        "the async read views), then point --wsgi and --asgi at them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi", default="http://127.0.0.1:8000", help="Base URL of the WSGI server.")
+        parser.add_argument("--asgi", default="http://127.0.0.1:8001", help="Base URL of the ASGI server.")
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help=f"Path to request (repeatable). Defaults to {', '.join(DEFAULT_PATHS)}.",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, nargs="+", default=[1, 16, 64],
+            help="Numbers of requests kept in flight at once.",
+        )
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per path and concurrency level.")
+        parser.add_argument("--token", help="JWT access token, to time authenticated reads.")
+
+    def handle(self, *args, **options):
+        headers = {"Authorization": f"Bearer {options['token']}"} if options["token"] else {}
+        targets = [("wsgi", options["wsgi"]), ("asgi", options["asgi"])]
+        self.stdout.write(
+            f"{'server':<6} {'path':<28} {'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}"
+        )
+        for path in options["paths"] or DEFAULT_PATHS:
+            for concurrency in options["concurrency"]:
+                for name, base in targets:
+                    rate, latencies, errors = run(base, path, concurrency, options["requests"], headers)
+                    p50, p95 = percentiles(latencies)
+                    self.stdout.write(
+                        f"{name:<6} {path:<28} {concurrency:>5} {rate:>9.0f} {p50:>8.1f} {p95:>8.1f} {errors:>7}"
+                    )
+
+
+def run(base, path, concurrency, total, headers):
+    """Send `total` GETs to base+path from `concurrency` keep-alive
+    connections. Returns (requests per second, latencies in ms, errors)."""
+    url = urlsplit(base)
+    if url.scheme not in ("http", "https") or not url.netloc:
+        raise CommandError(f"Not an http(s) base URL: {base}")
+    connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    remaining = iter(range(total))
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def worker():
+        connection = connection_class(url.netloc, timeout=30)
+        mine, failed = [], 0
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    break
+            start = time.perf_counter()
+            try:
+                connection.request("GET", url.path.rstrip("/") + path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                continue
+            mine.append((time.perf_counter() - start) * 1000)
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return total / elapsed, latencies, sum(errors)
+
+
+def percentiles(latencies):
+    if len(latencies) < 2:
+        return (latencies[0], latencies[0]) if latencies else (0.0, 0.0)
+    cuts = statistics.quantiles(latencies, n=20)
+    return statistics.median(latencies), cuts[18]
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from blog import search
+from blog.benchmarking import make_rng, median_ms, scratch_databases, sentence
+from blog.models import Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare post search latency of the full-text index against the old "
+        "icontains scan, on a generated dataset in a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--query", action="append", dest="queries",
+            help="Search string to time (repeatable). Defaults to a mix of common and rare words.",
+        )
+
+    def handle(self, *args, **options):
+        queries = options["queries"] or ["django", "replica router", "histo", "velocity decay"]
+        with scratch_databases():
+            self.seed(options["posts"], options["batch_size"], options["seed"])
+            self.stdout.write(f"{'query':<20} {'matches':>9} {'icontains ms':>13} {'fts ms':>9}")
+            for query in queries:
+                self.stdout.write(self.time_query(query, options["repeat"]))
+
+    def seed(self, count, batch_size, seed):
+        rng = make_rng(seed)
+        author = User.objects.create_user(username="bench", password="bench")
+        for start in range(0, count, batch_size):
+            Post.objects.bulk_create(
+                Post(author=author, title=sentence(rng, 6), content=sentence(rng, 80))
+                for _ in range(min(batch_size, count - start))
+            )
+            self.stdout.write(f"\rseeded {min(start + batch_size, count)}/{count} posts", ending="")
+        self.stdout.write("")
+
+    def time_query(self, query, repeat):
+        posts = Post.objects.all()
+
+        def legacy():
+            matches = posts.filter(title__icontains=query) | posts.filter(content__icontains=query)
+            matches.count()
+            list(matches[:10])
+
+        def indexed():
+            matches = search.search_posts(posts, query)
+            matches.count()
+            search.attach_snippets(matches[:10], query)
+
+        matched = search.search_posts(posts, query).count()
+        return (
+            f"{query:<20} {matched:>9} {median_ms(legacy, repeat):>13.1f} {median_ms(indexed, repeat):>9.1f}"
+        )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.benchmarking import DATASET_DEFAULTS, add_dataset_arguments, make_rng, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Add a synthetic load-test dataset to the database: Zipf-distributed "
+        "likes, bookmarks and reposts, deep reply chains, tags and follows. "
+        "The defaults make about 1.2 million rows."
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument(
+            "--username-prefix", default="load",
+            help="Generated usernames are this prefix plus a number; pick a new one to generate again.",
+        )
+        parser.add_argument(
+            "--keep-indexes", action="store_true",
+            help="Leave secondary indexes in place while inserting (slower, but safe on a live database).",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        seed_dataset(
+            make_rng(options["seed"]),
+            **{name: options[name] for name in DATASET_DEFAULTS},
+            batch_size=options["batch_size"],
+            username_prefix=options["username_prefix"],
+            drop_indexes=not options["keep_indexes"],
+            log=lambda message: self.stdout.write(f"{time.perf_counter() - start:7.1f}s  {message}"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - start:.1f}s."))
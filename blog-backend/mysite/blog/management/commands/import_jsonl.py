@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.bulk_load import LOADERS, deferred_maintenance, finish_load, read_jsonl
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-load users, posts (with tags), comments and likes, reposts and "
+        "bookmarks from JSONL files in the format of /blog/export/<kind>/. "
+        "Primary keys are kept, except for engagement rows; counters, comment "
+        "paths, the search index and trending scores are rebuilt once at the end."
+    )
+
+    def add_arguments(self, parser):
+        for kind in LOADERS:
+            parser.add_argument(f"--{kind}", metavar="PATH", help=f"JSONL file of {kind}.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk insert and transaction.")
+        parser.add_argument(
+            "--keep-indexes", action="store_true",
+            help="Leave secondary indexes in place while loading (slower, but safe on a live database).",
+        )
+
+    def handle(self, *args, **options):
+        kinds = [kind for kind in LOADERS if options[kind]]
+        if not kinds:
+            raise CommandError(f"Nothing to import; pass at least one of --{', --'.join(LOADERS)}.")
+
+        models = [LOADERS[kind][0] for kind in kinds]
+        with deferred_maintenance(models, drop_indexes=not options["keep_indexes"]):
+            for kind in kinds:  # LOADERS order: referenced rows first
+                load = LOADERS[kind][1]
+                start = time.perf_counter()
+                count = load(read_jsonl(options[kind]), options["batch_size"])
+                self.stdout.write(f"{kind}: {count} rows in {time.perf_counter() - start:.1f}s")
+        self.stdout.write("Rebuilding counters, comment paths and trending scores...")
+        finish_load(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from blog.counters import rebuild_counters
+from blog.models import Post, Comment
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized engagement counters on posts and comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000,
+            help="Number of rows recomputed per UPDATE (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        for model in (Post, Comment):
+            updated = rebuild_counters(model, chunk_size=options["chunk_size"])
+            self.stdout.write(f"{model.__name__}: rebuilt counters for {updated} rows")
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from blog import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index over post titles and content."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        conn = connections[options["database"]]
+        if not search.is_supported(conn):
+            raise CommandError(f"Full-text search needs SQLite FTS5, not {conn.vendor}.")
+        search.ensure_index(conn)
+        search.rebuild_index(conn)
+        with conn.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {search.FTS_TABLE}({search.FTS_TABLE}) VALUES ('optimize')")
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
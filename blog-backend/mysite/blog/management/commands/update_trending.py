@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.trending import BATCH_SIZE, update_scores
+
+
+class Command(BaseCommand):
+    help = "Fold new engagement into the trending post and tag scores."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--loop", type=float, metavar="SECONDS",
+            help="Keep running, updating every SECONDS, instead of exiting after one pass.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = update_scores(options["batch_size"])
+            self.stdout.write(
+                f"posts: {result['post_events']} events, tags: {result['tag_events']} posts, "
+                f"pruned: {result['pruned']}"
+            )
+            if not options["loop"]:
+                return
+            time.sleep(options["loop"])
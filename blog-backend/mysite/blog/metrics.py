@@ -0,0 +1,231 @@
+"""Per-request timings: a Server-Timing header, Prometheus histograms and a
+slow-request log.
+
+RequestMetricsMiddleware opens a RequestMetrics for each request. Queries are
+timed by record_query, which is installed on every database connection as an
+execute wrapper (the hook behind connection.execute_wrapper), so it works
+with DEBUG off and keeps nothing but the slowest few statements.
+Serialization is the time response serializers spend building their data
+(TimedSerializerMixin, including any queries they run) plus rendering the
+body through TimedJSONRenderer.
+
+Each response says where its time went:
+
+    Server-Timing: db;dur=4.1;desc="6 queries", serialize;dur=0.8, total;dur=9.7
+
+and the same figures are added, per URL name, to histograms served at
+/metrics in the Prometheus text format. Histograms live in process memory,
+so with several workers each one reports its own. Requests slower than
+SLOW_REQUEST_MS are logged with their slowest queries.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar("blog_request_metrics", default=None)
+_order = count()  # tie-breaker, so the heap never compares SQL strings
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "db_seconds", "serialize_seconds", "serialize_depth", "slowest")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serialize_depth = 0  # nested serializers run inside their parent's timing
+        self.slowest = []  # min-heap of (seconds, order, sql)
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = (seconds, next(_order), sql)
+        if len(self.slowest) < settings.SLOW_REQUEST_TOP_QUERIES:
+            heapq.heappush(self.slowest, entry)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def top_queries(self):
+        return [(seconds, sql) for seconds, _, sql in sorted(self.slowest, reverse=True)]
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:  # outside a request: management commands, the view-count flusher
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - start)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """connection_created receiver that installs record_query once per
+    connection wrapper."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timing_serialization():
+    metrics = _current.get()
+    if metrics is None or metrics.serialize_depth:
+        yield
+        return
+    metrics.serialize_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialize_depth -= 1
+        metrics.serialize_seconds += time.perf_counter() - start
+
+
+class TimedSerializerMixin:
+    """Counts to_representation() as serialization; list before the
+    serializer (or ListSerializer) base in the class bases."""
+
+    def to_representation(self, instance):
+        with timing_serialization():
+            return super().to_representation(instance)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timing_serialization():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+#################################################
+# HISTOGRAMS
+#################################################
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}  # label value -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {label: list(values) for label, values in self._series.items()}
+        for label in sorted(series):
+            values = series[label]
+            cumulative = 0
+            for bound, hits in zip((*self.buckets, "+Inf"), values):
+                cumulative += hits
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {values[-1]:.6f}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {cumulative}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram("blog_request_duration_seconds", "Total request latency by view.", SECONDS_BUCKETS)
+DB_SECONDS = Histogram("blog_request_db_seconds", "Time spent in database queries per request.", SECONDS_BUCKETS)
+SERIALIZE_SECONDS = Histogram(
+    "blog_request_serialize_seconds", "Time spent serializing and rendering the response body per request.",
+    SECONDS_BUCKETS,
+)
+QUERIES = Histogram("blog_request_queries", "Database queries per request.", QUERY_BUCKETS)
+HISTOGRAMS = (REQUEST_SECONDS, DB_SECONDS, SERIALIZE_SECONDS, QUERIES)
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def observe(request, response, metrics, total):
+    view = view_label(request)
+    REQUEST_SECONDS.observe(view, total)
+    DB_SECONDS.observe(view, metrics.db_seconds)
+    SERIALIZE_SECONDS.observe(view, metrics.serialize_seconds)
+    QUERIES.observe(view, metrics.queries)
+
+    response["Server-Timing"] = ", ".join([
+        f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries"',
+        f"serialize;dur={metrics.serialize_seconds * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ])
+
+    if settings.SLOW_REQUEST_MS is not None and total * 1000 >= settings.SLOW_REQUEST_MS:
+        logger.warning(
+            "Slow request: %s %s (%s) took %.0f ms, %d queries in %.0f ms. Slowest queries:\n%s",
+            request.method, request.path, view, total * 1000, metrics.queries, metrics.db_seconds * 1000,
+            "\n".join(f"  {seconds * 1000:.1f} ms  {sql}" for seconds, sql in metrics.top_queries()),
+        )
+
+
+class RequestMetricsMiddleware:
+    """Time each request and its queries; install it first in MIDDLEWARE so
+    the total covers the other middleware too."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            observe(request, response, metrics, time.perf_counter() - start)
+            return response
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            observe(request, response, metrics, time.perf_counter() - start)
+            return response
+        finally:
+            _current.reset(token)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; only METRICS_ALLOWED_IPS may read it
+    (None allows everyone)."""
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed is not None and request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden()
+    lines = [line for histogram in HISTOGRAMS for line in histogram.expose()]
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, key):
+    counts = queryset.filter(**{key: OuterRef("pk")}).order_by().values(key).annotate(n=Count("pk")).values("n")
+    return Coalesce(Subquery(counts), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    Comment = apps.get_model("blog", "Comment")
+    sources = {
+        "likes_count": apps.get_model("blog", "Like"),
+        "reposts_count": apps.get_model("blog", "Repost"),
+        "bookmarks_count": apps.get_model("blog", "Bookmark"),
+    }
+    for model_name in ("post", "comment"):
+        model = apps.get_model("blog", model_name)
+        fields = {}
+        ct = ContentType.objects.filter(app_label="blog", model=model_name).first()
+        if ct is not None:
+            for field, source in sources.items():
+                fields[field] = _count(source.objects.filter(content_type=ct), "object_id")
+        if model_name == "post":
+            fields["comments_count"] = _count(Comment.objects.all(), "post")
+        model.objects.update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_excerpt'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='bookmarks_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reposts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='bookmarks_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reposts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
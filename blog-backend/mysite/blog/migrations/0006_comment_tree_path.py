@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+def _children(Comment, parent_ids):
+    if parent_ids is None:
+        yield from Comment.objects.filter(parent__isnull=True).only("id", "parent_id").iterator()
+        return
+    for start in range(0, len(parent_ids), 500):
+        chunk = parent_ids[start:start + 500]
+        yield from Comment.objects.filter(parent_id__in=chunk).only("id", "parent_id").iterator()
+
+
+def backfill_tree(apps, schema_editor):
+    """Derive path/depth from the existing parent links, one tree level at a time."""
+    Comment = apps.get_model("blog", "Comment")
+    paths = {None: ""}
+    parent_ids = None
+    depth = 0
+    while paths:
+        next_paths = {}
+        batch = []
+        for comment in _children(Comment, parent_ids):
+            comment.path = paths[comment.parent_id] + f"{comment.pk:010d}/"
+            comment.depth = depth
+            next_paths[comment.pk] = comment.path
+            batch.append(comment)
+        Comment.objects.bulk_update(batch, ["path", "depth"], batch_size=500)
+        paths, parent_ids, depth = next_paths, list(next_paths), depth + 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=1100),
+        ),
+        migrations.RunPython(backfill_tree, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='blog_comment_post_path_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from blog import search
+
+
+def create_index(apps, schema_editor):
+    search.ensure_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    if not search.is_supported(schema_editor.connection):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name in search.TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {search.FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_comment_tree_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
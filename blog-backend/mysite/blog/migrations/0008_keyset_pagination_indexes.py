@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_search_index'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['created', 'id'], name='blog_bookmark_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', 'created', 'id'], name='blog_bookmark_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_at', 'id'], name='blog_comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['created', 'id'], name='blog_like_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['user', 'created', 'id'], name='blog_like_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_at', 'id'], name='blog_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'created_at', 'id'], name='blog_post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repost',
+            index=models.Index(fields=['created', 'id'], name='blog_repost_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repost',
+            index=models.Index(fields=['user', 'created', 'id'], name='blog_repost_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_follow_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingCursor',
+            fields=[
+                ('source', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='blog.post')),
+                ('score', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='blog_postscore_score_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TagScore',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='blog.tag')),
+                ('score', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='blog_tagscore_score_idx')],
+            },
+        ),
+    ]
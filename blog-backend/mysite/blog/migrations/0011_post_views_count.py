@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_trending_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='views_count',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
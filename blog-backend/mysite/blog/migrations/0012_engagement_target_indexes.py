@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_post_views_count'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['content_type', 'object_id', 'created', 'id'], name='blog_bookmark_target_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['content_type', 'object_id', 'created', 'id'], name='blog_like_target_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repost',
+            index=models.Index(fields=['content_type', 'object_id', 'created', 'id'], name='blog_repost_target_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Q
+from django.utils.text import Truncator
+
+EXCERPT_CHARS = 280
+
+
+def fill_excerpts(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    posts = Post.objects.filter(Q(excerpt__isnull=True) | Q(excerpt='')).only('id', 'content')
+    batch = []
+    for post in posts.iterator(chunk_size=2000):
+        post.excerpt = Truncator(' '.join(post.content.split())).chars(EXCERPT_CHARS)
+        batch.append(post)
+        if len(batch) == 2000:
+            Post.objects.bulk_update(batch, ['excerpt'])
+            batch = []
+    Post.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_engagement_target_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
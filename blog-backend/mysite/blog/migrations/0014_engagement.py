@@ -0,0 +1,152 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+BATCH_SIZE = 2000
+
+# Old table -> (kind, trending cursor that reads it).
+KINDS = {
+    'Like': (1, 'post:like'),
+    'Bookmark': (2, 'post:bookmark'),
+    'Repost': (3, 'post:repost'),
+}
+TARGET_TYPES = {'post': 1, 'comment': 2}
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        chunk.append(row)
+        if len(chunk) == BATCH_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _copy(rows, target, build, cursor):
+    """Insert `build(row)` into `target` for every row, in id order, keeping
+    the original created times. Rows get new ids, so the trending cursor that
+    read the old table is moved to the new id of the last row it had read."""
+    created = target._meta.get_field('created')
+    created.auto_now_add = False
+    try:
+        last_read = target.objects.aggregate(last=Max('id'))['last'] or 0
+        for chunk in _chunks(rows.order_by('id')):
+            inserted = target.objects.bulk_create([build(row) for row in chunk])
+            if cursor is not None:
+                for row, new in zip(chunk, inserted):
+                    if row.pk <= cursor.last_id:
+                        last_read = new.pk
+    finally:
+        created.auto_now_add = True
+    if cursor is not None:
+        cursor.last_id = last_read
+        cursor.save()
+
+
+def _content_types(apps):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    return {
+        TARGET_TYPES[model]: ContentType.objects.get_or_create(app_label='blog', model=model)[0].pk
+        for model in TARGET_TYPES
+    }
+
+
+def to_engagement(apps, schema_editor):
+    Engagement = apps.get_model('blog', 'Engagement')
+    TrendingCursor = apps.get_model('blog', 'TrendingCursor')
+    target_types = {ct: target_type for target_type, ct in _content_types(apps).items()}
+    for name, (kind, source) in KINDS.items():
+        rows = apps.get_model('blog', name).objects.filter(content_type__in=list(target_types))
+        _copy(rows, Engagement, lambda row: Engagement(
+            user_id=row.user_id, kind=kind, target_type=target_types[row.content_type_id],
+            target_id=row.object_id, created=row.created,
+        ), TrendingCursor.objects.filter(source=source).first())
+
+
+def from_engagement(apps, schema_editor):
+    Engagement = apps.get_model('blog', 'Engagement')
+    TrendingCursor = apps.get_model('blog', 'TrendingCursor')
+    content_types = _content_types(apps)
+    for name, (kind, source) in KINDS.items():
+        model = apps.get_model('blog', name)
+        _copy(Engagement.objects.filter(kind=kind), model, lambda row: model(
+            user_id=row.user_id, content_type_id=content_types[row.target_type],
+            object_id=row.target_id, created=row.created,
+        ), TrendingCursor.objects.filter(source=source).first())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_post_excerpt_backfill'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Engagement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'like'), (2, 'bookmark'), (3, 'repost')])),
+                ('target_type', models.PositiveSmallIntegerField(choices=[(1, 'post'), (2, 'comment')])),
+                ('target_id', models.PositiveBigIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='engagements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['kind', 'created', 'id'], name='blog_engagement_kind_idx'),
+                    models.Index(fields=['user', 'kind', 'created', 'id'], name='blog_engagement_user_idx'),
+                    models.Index(fields=['target_type', 'target_id', 'kind', 'created', 'id'], name='blog_engagement_target_idx'),
+                ],
+                'unique_together': {('user', 'target_type', 'target_id', 'kind')},
+            },
+        ),
+        migrations.RunPython(to_engagement, from_engagement),
+        migrations.DeleteModel(
+            name='Bookmark',
+        ),
+        migrations.DeleteModel(
+            name='Like',
+        ),
+        migrations.DeleteModel(
+            name='Repost',
+        ),
+        migrations.CreateModel(
+            name='Bookmark',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('blog.engagement',),
+        ),
+        migrations.CreateModel(
+            name='Like',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('blog.engagement',),
+        ),
+        migrations.CreateModel(
+            name='Repost',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('blog.engagement',),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+
+
+def to_post_tags(apps, schema_editor):
+    """Tag scores used to read posts and now read post/tag rows. The new
+    cursor starts just before the first row of a post the old one had not
+    reached; later rows on older posts are mostly tags added after it passed
+    them, which the old source never counted."""
+    TrendingCursor = apps.get_model('blog', 'TrendingCursor')
+    PostTag = apps.get_model('blog', 'Post').tags.through
+    old = TrendingCursor.objects.filter(source='tag:post').first()
+    if old is None:
+        return
+    unread = PostTag.objects.filter(post_id__gt=old.last_id).order_by('id').values_list('id', flat=True).first()
+    if unread is None:
+        unread = (PostTag.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    TrendingCursor.objects.create(source='tag:posttag', last_id=unread - 1)
+    old.delete()
+
+
+def to_posts(apps, schema_editor):
+    TrendingCursor = apps.get_model('blog', 'TrendingCursor')
+    PostTag = apps.get_model('blog', 'Post').tags.through
+    new = TrendingCursor.objects.filter(source='tag:posttag').first()
+    if new is None:
+        return
+    read = PostTag.objects.filter(id__lte=new.last_id).order_by('-post_id').values_list('post_id', flat=True).first()
+    TrendingCursor.objects.create(source='tag:post', last_id=read or 0)
+    new.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_engagement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trendingcursor',
+            name='read_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(to_post_tags, to_posts),
+    ]
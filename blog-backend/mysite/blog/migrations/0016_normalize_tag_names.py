@@ -0,0 +1,69 @@
+import math
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def _normalize(name):
+    # As blog.tags.normalize_tags at the time of writing.
+    return " ".join(name.split()).lower()
+
+
+def _logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def merge_case_duplicates(apps, schema_editor):
+    """Tag names are normalized on write now; fold the older tags that differ
+    only in case or spacing into one tag with the normalized name, moving
+    their posts and trending scores onto it."""
+    Tag = apps.get_model('blog', 'Tag')
+    TagScore = apps.get_model('blog', 'TagScore')
+    PostTag = apps.get_model('blog', 'Post').tags.through
+
+    groups = defaultdict(list)
+    for tag in Tag.objects.order_by('id'):
+        name = _normalize(tag.name)
+        if name:
+            groups[name].append(tag)
+
+    for name, tags in groups.items():
+        if len(tags) == 1 and tags[0].name == name:
+            continue
+        keeper = next((tag for tag in tags if tag.name == name), tags[0])
+        duplicates = [tag.pk for tag in tags if tag.pk != keeper.pk]
+        if duplicates:
+            tagged = PostTag.objects.filter(tag_id=keeper.pk).values('post_id')
+            PostTag.objects.filter(tag_id__in=duplicates, post_id__in=tagged).delete()
+            # A post may carry several duplicates; keep one row per post.
+            seen = set()
+            for row in PostTag.objects.filter(tag_id__in=duplicates).order_by('id'):
+                if row.post_id in seen:
+                    row.delete()
+                else:
+                    seen.add(row.post_id)
+            PostTag.objects.filter(tag_id__in=duplicates).update(tag_id=keeper.pk)
+
+            scores = list(TagScore.objects.filter(tag_id__in=[keeper.pk, *duplicates]))
+            if scores:
+                merged = scores[0].score
+                for row in scores[1:]:
+                    merged = _logaddexp(merged, row.score)
+                TagScore.objects.filter(tag_id__in=duplicates).delete()
+                TagScore.objects.update_or_create(tag_id=keeper.pk, defaults={'score': merged})
+            Tag.objects.filter(pk__in=duplicates).delete()
+        if keeper.name != name:
+            keeper.name = name
+            keeper.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_trendingcursor_read_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_case_duplicates, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.contrib.contenttypes.models import ContentType
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.utils.text import Truncator
+
+EXCERPT_CHARS = 280
+
+
+def make_excerpt(content):
+    """The start of `content` on one line, cut at EXCERPT_CHARS with an ellipsis."""
+    return Truncator(" ".join(content.split())).chars(EXCERPT_CHARS)
 
 class User(AbstractUser):
     bio = models.TextField(blank=True, null=True)
@@ -9,6 +16,10 @@ class User(AbstractUser):
     avatar_url = models.CharField(max_length=255, blank=True, null=True)
     full_name = models.CharField(max_length=255, blank=True, null=True)
 
+    # Denormalized follow counters, kept in sync by the follow views.
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
 
@@ -26,11 +37,33 @@ class Post(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     tags = models.ManyToManyField(Tag, related_name="posts", blank=True)
 
+    # Denormalized engagement counters, kept in sync by the toggle views and
+    # rebuilt from the source rows by `manage.py rebuild_counters`.
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    reposts_count = models.PositiveIntegerField(default=0)
+    bookmarks_count = models.PositiveIntegerField(default=0)
+    # Written in batches by blog.view_counts, not on every view.
+    views_count = models.PositiveBigIntegerField(default=0)
+
     original_post = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='reposts')  # For reposts
 
+    class Meta:
+        indexes = [
+            # Keyset pagination keys, globally and per author.
+            models.Index(fields=['created_at', 'id'], name='blog_post_created_idx'),
+            models.Index(fields=['author', 'created_at', 'id'], name='blog_post_author_created_idx'),
+        ]
+
     def is_repost(self):
         return self.original_post is not None
 
+    def save(self, *args, **kwargs):
+        # List responses show the excerpt instead of the content.
+        if not self.excerpt:
+            self.excerpt = make_excerpt(self.content)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.author.username} - {self.title} (Repost)" if self.is_repost() else f"{self.author.username} - {self.title}"
 
@@ -48,48 +81,222 @@ class Comment(models.Model):
         related_name='replies',
         on_delete=models.CASCADE
     )
+
+    # Materialized path: the zero-padded ids of every ancestor and of the
+    # comment itself, e.g. "0000000004/0000000017/". Ordering by path gives a
+    # depth-first walk of the thread, and a subtree is a single path range.
+    path = models.CharField(max_length=1100, blank=True, default="", editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+
+    # Denormalized engagement counters (see Post).
+    likes_count = models.PositiveIntegerField(default=0)
+    reposts_count = models.PositiveIntegerField(default=0)
+    bookmarks_count = models.PositiveIntegerField(default=0)
+
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'path'], name='blog_comment_post_path_idx'),
+            models.Index(fields=['post', 'created_at', 'id'], name='blog_comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.author.username} - {self.content[:30]}"
 
-class Bookmark(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="generic_bookmarks")
-    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
-    object_id = models.PositiveIntegerField()
-    content_object = GenericForeignKey('content_type', 'object_id')
+    @staticmethod
+    def path_segment(pk):
+        return f"{pk:010d}/"
+
+    def save(self, *args, **kwargs):
+        # The path ends with our own id, so a new comment is written first and
+        # its path filled in right after.
+        if not self._state.adding or self.path:
+            return super().save(*args, **kwargs)
+        parent_path = self.parent.path if self.parent_id else ""
+        self.depth = self.parent.depth + 1 if self.parent_id else 0
+        super().save(*args, **kwargs)
+        self.path = parent_path + self.path_segment(self.pk)
+        Comment.objects.filter(pk=self.pk).update(path=self.path)
+
+class Engagement(models.Model):
+    """A like, bookmark or repost of a post or comment.
+
+    The three kinds share one table, and the target is typed by a small
+    integer rather than a ContentType join; target_id is a bigint like the
+    keys it refers to. Like, Bookmark and Repost are proxies that each see one
+    kind, and the properties below keep the generic-FK names of the tables
+    this replaced working.
+    """
+
+    class Kind(models.IntegerChoices):
+        LIKE = 1, "like"
+        BOOKMARK = 2, "bookmark"
+        REPOST = 3, "repost"
+
+    class TargetType(models.IntegerChoices):
+        POST = 1, "post"
+        COMMENT = 2, "comment"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="engagements")
+    kind = models.PositiveSmallIntegerField(choices=Kind.choices)
+    target_type = models.PositiveSmallIntegerField(choices=TargetType.choices)
+    target_id = models.PositiveBigIntegerField()
     created = models.DateTimeField(auto_now_add=True)
 
+    # Set by the per-kind proxies, and given to the rows they save.
+    proxy_kind = None
+
     class Meta:
-        unique_together = ('user', 'content_type', 'object_id')
+        # Toggles, and viewer state for every kind at once: (user, target_type, target_id IN ...).
+        unique_together = ('user', 'target_type', 'target_id', 'kind')
+        indexes = [
+            # Newest-first lists of one kind, globally and per user.
+            models.Index(fields=['kind', 'created', 'id'], name='blog_engagement_kind_idx'),
+            models.Index(fields=['user', 'kind', 'created', 'id'], name='blog_engagement_user_idx'),
+            # Counters, and the engagement of one target newest first.
+            models.Index(fields=['target_type', 'target_id', 'kind', 'created', 'id'], name='blog_engagement_target_idx'),
+        ]
+
+    @staticmethod
+    def target_type_for(model):
+        return TARGET_TYPES[model._meta.concrete_model]
+
+    @property
+    def target_model(self):
+        return TARGET_MODELS[self.target_type]
+
+    @property
+    def object_id(self):
+        return self.target_id
+
+    @property
+    def content_type_id(self):
+        return ContentType.objects.get_for_model(self.target_model).pk
+
+    @property
+    def content_object(self):
+        return self.target_model.objects.filter(pk=self.target_id).first()
+
+    @content_object.setter
+    def content_object(self, target):
+        self.target_type = self.target_type_for(type(target))
+        self.target_id = target.pk
+
+    def save(self, *args, **kwargs):
+        if self.kind is None:
+            self.kind = self.proxy_kind
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.user.username} bookmarked {self.content_object}"
+        return f"{self.user.username} {self.get_kind_display()} {self.get_target_type_display()} {self.target_id}"
+
+
+TARGET_MODELS = {Engagement.TargetType.POST: Post, Engagement.TargetType.COMMENT: Comment}
+TARGET_TYPES = {model: target_type for target_type, model in TARGET_MODELS.items()}
+
+
+class EngagementKindManager(models.Manager):
+    """The engagement rows of one kind."""
+
+    def __init__(self, kind):
+        super().__init__()
+        self.kind = kind
+
+    def get_queryset(self):
+        return super().get_queryset().filter(kind=self.kind)
 
 
-class Like(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="likes")
-    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)  # model type (Post/Comment)
-    object_id = models.PositiveIntegerField()  # ID of the object
-    content_object = GenericForeignKey('content_type', 'object_id')  # actual object
+class Like(Engagement):
+    proxy_kind = Engagement.Kind.LIKE
+    objects = EngagementKindManager(Engagement.Kind.LIKE)
+
+    class Meta:
+        proxy = True
+
+
+class Bookmark(Engagement):
+    proxy_kind = Engagement.Kind.BOOKMARK
+    objects = EngagementKindManager(Engagement.Kind.BOOKMARK)
+
+    class Meta:
+        proxy = True
+
+
+class Repost(Engagement):
+    proxy_kind = Engagement.Kind.REPOST
+    objects = EngagementKindManager(Engagement.Kind.REPOST)
+
+    class Meta:
+        proxy = True
+
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="following")
+    following = models.ForeignKey(User, on_delete=models.CASCADE, related_name="followers")
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('user', 'content_type', 'object_id')  # prevent duplicate likes
+        unique_together = ('follower', 'following')
+        indexes = [
+            # Fan-out reads every follower of an author.
+            models.Index(fields=['following', 'follower'], name='blog_follow_following_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} liked {self.content_object}"
+        return f"{self.follower.username} follows {self.following.username}"
 
-class Repost(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="reposts")
-    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
-    object_id = models.PositiveIntegerField()
-    content_object = GenericForeignKey('content_type', 'object_id')
-    created = models.DateTimeField(auto_now_add=True)
+
+class TimelineEntry(models.Model):
+    """One row of a user's materialized home timeline (see blog.timeline)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")  # author, or the reposter
+    is_repost = models.BooleanField(default=False)
+    created_at = models.DateTimeField()  # when the post or repost happened
 
     class Meta:
-        unique_together = ('user', 'content_type', 'object_id')
+        unique_together = ('user', 'post', 'actor')
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='blog_timeline_user_created_idx'),
+            models.Index(fields=['post', 'actor'], name='blog_timeline_post_actor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.post_id}"
+
+
+
+class PostScore(models.Model):
+    """Trending score of a post, maintained by blog.trending.
+
+    `score` is the log of the post's time-decayed engagement, expressed
+    relative to a fixed epoch, so rows updated at different times still
+    order correctly without being rewritten as time passes.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name="trending")
+    score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-score'], name='blog_postscore_score_idx')]
+
+
+class TagScore(models.Model):
+    """Usage velocity of a tag, on the same log scale as PostScore."""
+    tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True, related_name="trending")
+    score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-score'], name='blog_tagscore_score_idx')]
+
+
+class TrendingCursor(models.Model):
+    """Highest source row id already folded into the trending scores."""
+    source = models.CharField(max_length=50, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    read_at = models.DateTimeField(null=True)  # when the last run that moved it started
 
     def __str__(self):
-        return f"{self.user.username} reposted {self.content_object}"
+        return f"{self.source} @ {self.last_id}"
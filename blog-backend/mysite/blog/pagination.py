@@ -0,0 +1,148 @@
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 10  # default page size
+    page_size_query_param = 'page_size'  # allow client to override ?page_size=5
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views: the count and the page are
+        read with the async ORM, leaving a page that renders without queries."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [row async for row in self.page.object_list]
+        if self.page.paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+
+class KeysetPagination(StandardResultsSetPagination):
+    """Cursor pagination over a two-column key such as ("-created_at", "-id").
+
+    Each page is an index range seek past the last row of the previous page,
+    so there is no COUNT and no OFFSET, deep pages cost the same as the first,
+    and rows inserted while a client pages through do not shift its position.
+    Cursors are opaque base64 tokens; the response carries next/previous links.
+    """
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, position, reverse = self._seek(queryset, request)
+        return self._page(list(queryset[:self.page_size + 1]), position, reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset, position, reverse = self._seek(queryset, request)
+        return self._page([row async for row in queryset[:self.page_size + 1]], position, reverse)
+
+    def _seek(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering if not reverse else tuple(_flip(field) for field in self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(_after(ordering, position))
+        return queryset, position, reverse
+
+    def _page(self, rows, position, reverse):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        self.first_key = self.key_of(rows[0]) if rows else None
+        self.last_key = self.key_of(rows[-1]) if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next or self.last_key is None:
+            return None
+        return self.link(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_key is None:
+            return None
+        return self.link(self.first_key, reverse=True)
+
+    def key_of(self, row):
+        return [getattr(row, field.lstrip("-")) for field in self.ordering]
+
+    def link(self, key, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(remove_query_param(url, "page"), self.cursor_query_param, self.encode_cursor(key, reverse))
+
+    def encode_cursor(self, key, reverse):
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+        payload = json.dumps({"k": values, "r": reverse}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            first, second = payload["k"]
+            return (datetime.fromisoformat(first), int(second)), bool(payload.get("r"))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _after(ordering, position):
+    """Rows strictly after `position` in `ordering`.
+
+    Written as ``a <= x AND (a < x OR b > y)`` rather than the plain OR so
+    SQLite can still walk the leading key column as an index range.
+    """
+    (first, second), (first_value, second_value) = ordering, position
+    first_op = "lt" if first.startswith("-") else "gt"
+    second_op = "lt" if second.startswith("-") else "gt"
+    first, second = first.lstrip("-"), second.lstrip("-")
+    return Q(**{f"{first}__{first_op}e": first_value}) & (
+        Q(**{f"{first}__{first_op}": first_value}) | Q(**{f"{second}__{second_op}": second_value})
+    )
+
+
+def get_paginator(request, ordering):
+    """Page-number pagination by default; keyset when the client opts in with
+    ?pagination=cursor (or follows a link that already carries a cursor)."""
+    params = request.query_params
+    if params.get("pagination") == "cursor" or params.get(KeysetPagination.cursor_query_param):
+        return KeysetPagination(ordering)
+    return StandardResultsSetPagination()
@@ -0,0 +1,204 @@
+"""Versioned response cache for hot GET endpoints.
+
+Cached bodies are keyed on the request path plus the current version of every
+scope the response depends on ("posts" for list pages, "post:<pk>" for one
+post and its comments). Only anonymous requests share cached bodies, since
+authenticated responses carry per-viewer state. Writes bump the versions instead of deleting keys, so
+invalidation is O(1) and old entries simply age out of the backend.
+
+Each entry carries a soft expiry ahead of the backend TTL. The first request to
+see an expired entry takes a short lock and rebuilds it while concurrent
+requests keep serving the stale copy; on a cold key the others wait briefly
+for the rebuild instead of all hitting the database at once.
+
+Versions live in the default cache, so a bump only reaches the workers that
+share it. Running more than one worker needs a shared BLOG_CACHE_BACKEND;
+with the default locmem, the other workers keep serving their cached bodies
+until the soft expiry (RESPONSE_CACHE_TIMEOUT).
+"""
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+POSTS_SCOPE = "posts"
+
+# Endpoint names passed to cached_response(), reported by stats().
+ENDPOINTS = ("post-list", "post-detail", "post-page")
+
+LOCK_TIMEOUT = 10  # seconds a rebuild may hold the lock
+LOCK_WAIT = 2.0  # seconds a request waits for someone else's rebuild
+LOCK_POLL = 0.05
+
+STAT_KINDS = ("hit", "stale", "miss")
+
+
+def post_scope(pk):
+    return f"post:{pk}"
+
+
+def _version_key(scope):
+    return f"respcache:v:{scope}"
+
+
+def versions(*scopes):
+    """Current version of each scope, starting new scopes at a timestamp so a
+    scope evicted from the cache never reuses an old version number."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_post(pk):
+    """Invalidate one post (detail, comments) and every cached list page,
+    once the current transaction commits."""
+    transaction.on_commit(lambda: bump(POSTS_SCOPE, post_scope(pk)))
+
+
+def invalidate_lists():
+    transaction.on_commit(lambda: bump(POSTS_SCOPE))
+
+
+def is_cached_list_page(request):
+    """Only the first few page-numbered pages are worth caching."""
+    params = request.query_params
+    if params.get("cursor") or params.get("pagination") == "cursor":
+        return False
+    page = params.get("page", "1")
+    return page.isdigit() and int(page) <= settings.RESPONSE_CACHE_MAX_PAGE
+
+
+def _count(name, kind):
+    key = f"respcache:stats:{name}:{kind}"
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def stats():
+    """Hit/stale/miss counters per cached endpoint name."""
+    keys = {f"respcache:stats:{name}:{kind}": (name, kind) for name in ENDPOINTS for kind in STAT_KINDS}
+    counts = cache.get_many(list(keys))
+    result = {name: dict.fromkeys(STAT_KINDS, 0) for name in ENDPOINTS}
+    for key, value in counts.items():
+        name, kind = keys[key]
+        result[name][kind] = value
+    return result
+
+
+def cached_response(request, name, scopes, build):
+    """Return a Response for `request`, from cache when possible.
+
+    `build` is called without arguments on a miss and must return the
+    response data; exceptions (e.g. Http404) propagate and are not cached.
+    """
+    if request.user.is_authenticated:
+        # Responses carry per-viewer state, so only anonymous reads are shared.
+        return Response(build())
+
+    key = _entry_key(request, name, versions(*scopes))
+    lock_key = f"{key}:lock"
+
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None and entry[1] > now:
+        return _respond(name, "hit", entry[0])
+
+    locked = cache.add(lock_key, 1, timeout=LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return _respond(name, "stale", entry[0])
+        deadline = now + LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None:
+                return _respond(name, "hit", entry[0])
+        # The rebuilding request is taking too long; build our own copy.
+
+    try:
+        data = build()
+        ttl = settings.RESPONSE_CACHE_TIMEOUT
+        # Keep the entry around past its soft expiry so it can be served stale.
+        cache.set(key, (data, time.time() + ttl), timeout=ttl * 2)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return _respond(name, "miss", data)
+
+
+def _entry_key(request, name, scope_versions):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    version_tag = ".".join(str(v) for v in scope_versions)
+    return f"respcache:{name}:{version_tag}:{digest}"
+
+
+def _respond(name, kind, data):
+    _count(name, kind)
+    response = Response(data)
+    response["X-Cache"] = kind.upper()
+    return response
+
+
+async def acached_data(request, name, scopes, build):
+    """cached_response() for async views.
+
+    `build` is a coroutine function returning the response data. Returns
+    (data, kind), where kind is "hit", "stale", "miss" or None when the
+    request bypassed the cache.
+    """
+    if request.user.is_authenticated:
+        return await build(), None
+
+    key = _entry_key(request, name, await sync_to_async(versions)(*scopes))
+    lock_key = f"{key}:lock"
+
+    entry = await cache.aget(key)
+    now = time.time()
+    if entry is not None and entry[1] > now:
+        return await _acounted(name, "hit", entry[0])
+
+    locked = await cache.aadd(lock_key, 1, timeout=LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return await _acounted(name, "stale", entry[0])
+        deadline = now + LOCK_WAIT
+        while time.time() < deadline:
+            await asyncio.sleep(LOCK_POLL)
+            entry = await cache.aget(key)
+            if entry is not None:
+                return await _acounted(name, "hit", entry[0])
+
+    try:
+        data = await build()
+        ttl = settings.RESPONSE_CACHE_TIMEOUT
+        await cache.aset(key, (data, time.time() + ttl), timeout=ttl * 2)
+    finally:
+        if locked:
+            await cache.adelete(lock_key)
+    return await _acounted(name, "miss", data)
+
+
+async def _acounted(name, kind, data):
+    await sync_to_async(_count)(name, kind)
+    return data, kind
@@ -0,0 +1,117 @@
+"""Primary/replica database routing with read-your-writes stickiness.
+
+Writes always go to "default" (the primary). Reads go to "replica" unless
+the current request has already written, a transaction is open on the
+primary, or the requesting user wrote something within the last
+REPLICA_PIN_SECONDS. That last window is remembered in the default cache
+under the user id, so it only holds across workers when that cache is shared
+(BLOG_CACHE_BACKEND other than locmem); with locmem, a worker that did not
+see the write sends the user's next reads to the replica. Without a
+"replica" alias in DATABASES everything stays on the primary.
+
+PrimaryPinningMiddleware tracks the request state and has to be installed
+with the router.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+REPLICA_DB_ALIAS = "replica"
+
+# Per request (or per thread/task outside requests): has the user written
+# recently, and has this request written?
+_pinned = ContextVar("blog_primary_pinned", default=False)
+_wrote = ContextVar("blog_primary_wrote", default=False)
+
+_jwt = JWTAuthentication()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if REPLICA_DB_ALIAS not in settings.DATABASES or _pinned.get() or _wrote.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a write transaction must see its uncommitted rows.
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != "django_cache":  # DatabaseCache bookkeeping is not user data
+            _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pin_key(user_id):
+    return f"dbpin:user:{user_id}"
+
+
+def _token_user_id(request):
+    """User id claimed by the request's access token, checked without a
+    database lookup; None for anonymous or invalid requests."""
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        return _jwt.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
+        return None
+
+
+def _reset(tokens):
+    pinned, wrote = tokens
+    _wrote.reset(wrote)
+    _pinned.reset(pinned)
+
+
+class PrimaryPinningMiddleware:
+    """Read from the primary for users who wrote within REPLICA_PIN_SECONDS,
+    and start that window whenever an authenticated request writes.
+
+    Users are identified by their access token alone, so this costs no query.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        user_id = _token_user_id(request)
+        tokens = _pinned.set(user_id is not None and cache.get(_pin_key(user_id)) is not None), _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if user_id is not None and _wrote.get():
+                cache.set(_pin_key(user_id), 1, timeout=settings.REPLICA_PIN_SECONDS)
+            return response
+        finally:
+            _reset(tokens)
+
+    async def __acall__(self, request):
+        user_id = _token_user_id(request)
+        tokens = _pinned.set(user_id is not None and await cache.aget(_pin_key(user_id)) is not None), _wrote.set(False)
+        try:
+            response = await self.get_response(request)
+            if user_id is not None and _wrote.get():
+                await cache.aset(_pin_key(user_id), 1, timeout=settings.REPLICA_PIN_SECONDS)
+            return response
+        finally:
+            _reset(tokens)
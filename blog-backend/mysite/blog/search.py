@@ -0,0 +1,140 @@
+import html
+import re
+
+from django.db import connection, connections
+
+# SQLite FTS5 index over Post.title/content. It is an external-content table
+# (the text lives only in blog_post) kept in sync by triggers, so every write
+# path -- save(), delete(), queryset.update() and bulk_create() -- updates it.
+FTS_TABLE = "blog_post_fts"
+
+# snippet() delimiters, swapped for <mark> tags once the text is escaped.
+# Control characters, so post text is not expected to contain them; if it
+# does, the worst outcome is a misplaced highlight, never markup.
+MARK_OPEN, MARK_CLOSE = "\x02", "\x03"
+
+# bm25() column weights: a hit in the title counts ten times a body hit.
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+CREATE_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    title, content,
+    content='blog_post', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+"""
+
+TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON blog_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+    """,
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON blog_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+        END
+    """,
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, content ON blog_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+    """,
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def is_supported(conn=connection):
+    return conn.vendor == "sqlite"
+
+
+def rebuild_index(conn=connection):
+    """Re-read every post into the index."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def ensure_index(conn=connection):
+    """Create the index and its triggers if they are missing.
+
+    SQLite migrations that rebuild blog_post (e.g. adding a column with a
+    default) drop the triggers along with the old table, so this runs after
+    every migrate and rebuilds the index whenever a trigger had to be restored.
+    """
+    if not is_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            [f"{FTS_TABLE}_%"],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        cursor.execute(CREATE_TABLE)
+        for name, sql in TRIGGERS.items():
+            cursor.execute(sql)
+    if existing != set(TRIGGERS):
+        rebuild_index(conn)
+
+
+def ensure_index_after_migrate(sender, using, **kwargs):
+    ensure_index(connections[using])
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    tokens = _TOKEN_RE.findall(query)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search_posts(queryset, query):
+    """Restrict `queryset` to posts matching `query`, best matches first."""
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    if not is_supported():
+        return queryset.filter(title__icontains=query) | queryset.filter(content__icontains=query)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = blog_post.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+        select={"search_rank": f"bm25({FTS_TABLE}, %s, %s)"},
+        select_params=[TITLE_WEIGHT, CONTENT_WEIGHT],
+    ).order_by("search_rank", "-id")
+
+
+def _highlight(snippet):
+    return html.escape(snippet).replace(MARK_OPEN, "<mark>").replace(MARK_CLOSE, "</mark>")
+
+
+def attach_snippets(posts, query, tokens=16):
+    """Set `search_snippet` on each post: the best-matching fragment,
+    HTML-escaped, with the hits wrapped in <mark>.
+
+    Done as a second query over the page only, since snippet() is too costly
+    to evaluate for every match before the rank sort. It runs on the database
+    the page was read from, so both see the same rows.
+    """
+    posts = list(posts)
+    match = match_expression(query)
+    if not posts or not match:
+        return posts
+    conn = connections[posts[0]._state.db]
+    if not is_supported(conn):
+        return posts
+    placeholders = ", ".join(["%s"] * len(posts))
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, '…', %s) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [MARK_OPEN, MARK_CLOSE, tokens, match, *(post.pk for post in posts)],
+        )
+        snippets = dict(cursor.fetchall())
+    for post in posts:
+        post.search_snippet = _highlight(snippets.get(post.pk, ""))
+    return posts
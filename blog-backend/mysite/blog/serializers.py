@@ -1,17 +1,68 @@
-from django.contrib.contenttypes.models import ContentType
 from rest_framework import serializers
-from .models import User, Post, Comment, Like, Repost, Bookmark, Tag
+from .models import User, Post, Comment, Engagement, Like, Repost, Bookmark, TimelineEntry, PostScore, TagScore
+from .threads import load_threads
+from .engagement import resolve_viewer_state, has_engaged, resolve_targets, resolved_target
+from .fieldsets import SparseFieldsMixin, only_requested, requested
+from .metrics import TimedSerializerMixin
+from .tags import set_post_tags
+from .trending import current_score
+from . import view_counts
+
+
+# -----------------------------
+# VIEWER STATE (is_liked / is_bookmarked / is_reposted)
+# -----------------------------
+class ViewerStateListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """Resolves viewer state for the whole page before any row is rendered."""
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        self.child.resolve_viewer_state(items)
+        return super().to_representation(items)
+
+
+class ViewerStateMixin(serializers.Serializer):
+    is_liked = serializers.SerializerMethodField()
+    is_bookmarked = serializers.SerializerMethodField()
+    is_reposted = serializers.SerializerMethodField()
+
+    def viewer_state_objects(self, items):
+        return items
+
+    def wants_viewer_state(self):
+        # False when a sparse fieldset leaves all three flags out.
+        return not self.fields.keys().isdisjoint(("is_liked", "is_bookmarked", "is_reposted"))
+
+    def resolve_viewer_state(self, items):
+        if self.wants_viewer_state():
+            resolve_viewer_state(self.context, self.Meta.model, self.viewer_state_objects(items))
+
+    def to_representation(self, instance):
+        self.resolve_viewer_state([instance])  # no-op when a list already did it
+        return super().to_representation(instance)
+
+    def get_is_liked(self, obj):
+        return has_engaged(self.context, self.Meta.model, obj, "liked")
+
+    def get_is_bookmarked(self, obj):
+        return has_engaged(self.context, self.Meta.model, obj, "bookmarked")
+
+    def get_is_reposted(self, obj):
+        return has_engaged(self.context, self.Meta.model, obj, "reposted")
 
 
 # -----------------------------
 # USER SERIALIZER (for nesting)
 # -----------------------------
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     
 
     class Meta:
         model = User
-        fields = ['id', 'full_name', 'username', 'email', 'bio', 'phone_number', 'avatar_url', 'password',]
+        fields = ['id', 'full_name', 'username', 'email', 'bio', 'phone_number', 'avatar_url', 'password',
+                  'followers_count', 'following_count']
+        read_only_fields = ['followers_count', 'following_count']
+        extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
         user = User.objects.create_user(
@@ -24,10 +75,18 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class AuthorSerializer(serializers.ModelSerializer):
+    """What a list needs to show who wrote or engaged with something."""
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'full_name', 'avatar_url']
+
+
 # -----------------------------
 # POST SERIALIZER
 # -----------------------------
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(TimedSerializerMixin, SparseFieldsMixin, ViewerStateMixin, serializers.ModelSerializer):
     tags = serializers.ListField(
         child=serializers.CharField(max_length=50), write_only=True, required=False
     )
@@ -36,121 +95,259 @@ class PostSerializer(serializers.ModelSerializer):
 
 
     author = UserSerializer(read_only=True)  # Nested author details
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
-    reposts_count = serializers.SerializerMethodField()
-    bookmarks_count = serializers.SerializerMethodField()
+    views_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = [
             'id', 'author', 'title', 'content', 'created_at', 'tags', 'tag_list', 'excerpt',
-            'likes_count', 'comments_count', 'reposts_count', 'bookmarks_count'
+            'likes_count', 'comments_count', 'reposts_count', 'bookmarks_count', 'views_count',
+            'is_liked', 'is_bookmarked', 'is_reposted',
         ]
+        # Stored counters, maintained by the engagement views.
+        read_only_fields = ['likes_count', 'comments_count', 'reposts_count', 'bookmarks_count']
+        list_serializer_class = ViewerStateListSerializer
+
+    compact_fields = {'author': AuthorSerializer}
+    list_omit = ['content']
+    field_columns = {'views_count': ['views_count']}
+    field_aliases = {'tags': 'tag_list'}
 
     def get_tag_list(self, obj):
         return [tag.name for tag in obj.tags.all()]
 
+    def get_views_count(self, obj):
+        # Stored count plus this worker's views that are not flushed yet.
+        return obj.views_count + view_counts.counter.pending_for(obj.pk)
 
-
-    def get_likes_count(self, obj):
-        content_type = ContentType.objects.get_for_model(Post)
-        return Like.objects.filter(content_type=content_type, object_id=obj.id).count()
-        
-
-    def get_comments_count(self, obj):
-        return obj.comments.count()
-
-    def get_reposts_count(self, obj):
-        content_type = ContentType.objects.get_for_model(Post)
-        return Repost.objects.filter(content_type=content_type, object_id=obj.id).count()
-
-    def get_bookmarks_count(self, obj):
-        content_type = ContentType.objects.get_for_model(Post)
-        return Bookmark.objects.filter(content_type=content_type, object_id=obj.id).count()
-    
     def create(self, validated_data):
         tags_data = validated_data.pop("tags", [])
         post = Post.objects.create(**validated_data)
-        for tag_name in tags_data:
-            tag_obj, _ = Tag.objects.get_or_create(name=tag_name)
-            post.tags.add(tag_obj)
+        if tags_data:
+            set_post_tags(post, tags_data, created=True)
         return post
     
     def update(self, instance, validated_data):
         tags_data = validated_data.pop("tags", None)
+        if "content" in validated_data and "excerpt" not in validated_data:
+            instance.excerpt = None  # rebuilt from the new content on save
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
 
         if tags_data is not None:
-            instance.tags.clear()
-            for tag_name in tags_data:
-                tag_obj, _ = Tag.objects.get_or_create(name=tag_name)
-                instance.tags.add(tag_obj)
+            set_post_tags(instance, tags_data)
         return instance
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        rep["tags"] = [tag.name for tag in instance.tags.all()]  # list of strings
+        if "tag_list" in rep:
+            rep["tags"] = rep["tag_list"]  # list of strings, already built by get_tag_list
+        if hasattr(instance, "search_snippet"):
+            rep["snippet"] = instance.search_snippet  # highlighted match, search results only
         return rep
 
 
 # -----------------------------
 # COMMENT SERIALIZER (nested)
 # -----------------------------
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(TimedSerializerMixin, SparseFieldsMixin, ViewerStateMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)  # Nested author details
     replies = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
-    reposts_count = serializers.SerializerMethodField()
-    bookmarks_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
         fields = [
-            'id', 'author', 'content', 'created_at', 'parent',
-            'likes_count', 'reposts_count', 'bookmarks_count', 'replies'
+            'id', 'author', 'content', 'created_at', 'parent', 'depth',
+            'likes_count', 'reposts_count', 'bookmarks_count', 'replies',
+            'is_liked', 'is_bookmarked', 'is_reposted',
         ]
+        read_only_fields = ['likes_count', 'reposts_count', 'bookmarks_count']
+        list_serializer_class = ViewerStateListSerializer
+
+    compact_fields = {'author': AuthorSerializer}
+
+    def viewer_state_objects(self, items):
+        # Whole threads: replies are rendered by nested serializers that then
+        # find their state already resolved.
+        stack = list(items)
+        while stack:
+            comment = stack.pop()
+            yield comment
+            if not hasattr(comment, "_replies"):
+                load_threads([comment])
+            stack.extend(comment._replies)
 
     def get_replies(self, obj):
-        return CommentSerializer(obj.replies.all(), many=True).data
+        # Replies are attached in memory by blog.threads; a comment that was
+        # loaded on its own fetches its whole subtree in one query here.
+        if not hasattr(obj, "_replies"):
+            load_threads([obj])
+        return CommentSerializer(obj._replies, many=True, context=self.context).data
 
-    def get_likes_count(self, obj):
-        content_type = ContentType.objects.get_for_model(Comment)
-        return Like.objects.filter(content_type=content_type, object_id=obj.id).count()
-
-    def get_reposts_count(self, obj):
-        content_type = ContentType.objects.get_for_model(Comment)
-        return Repost.objects.filter(content_type=content_type, object_id=obj.id).count()
-
-    def get_bookmarks_count(self, obj):
-        content_type = ContentType.objects.get_for_model(Comment)
-        return Bookmark.objects.filter(content_type=content_type, object_id=obj.id).count()
+    def update(self, instance, validated_data):
+        # Moving a comment would invalidate the stored paths of its subtree.
+        validated_data.pop("parent", None)
+        return super().update(instance, validated_data)
 
 
 # -----------------------------
 # GENERIC SERIALIZERS (Flat)
 # -----------------------------
-class LikeSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class PostSummarySerializer(serializers.ModelSerializer):
+    author = AuthorSerializer(read_only=True)
 
     class Meta:
-        model = Like
-        fields = ['id', 'user', 'content_type', 'object_id', 'created']
+        model = Post
+        fields = ['id', 'title', 'excerpt', 'author', 'created_at']
 
 
-class RepostSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class CommentSummarySerializer(serializers.ModelSerializer):
+    author = AuthorSerializer(read_only=True)
 
     class Meta:
-        model = Repost
-        fields = ['id', 'user', 'content_type', 'object_id', 'created']
+        model = Comment
+        fields = ['id', 'post', 'content', 'author', 'created_at']
+
+
+# Target type -> serializer of the summary embedded by ?include=target.
+TARGET_SUMMARIES = {
+    Engagement.TargetType.POST: PostSummarySerializer,
+    Engagement.TargetType.COMMENT: CommentSummarySerializer,
+}
+
+
+def target_querysets():
+    """Per target type, the query that loads just what its summary shows."""
+    return {
+        target_type: only_requested(summary.Meta.model.objects.select_related('author'), summary, {})
+        for target_type, summary in TARGET_SUMMARIES.items()
+    }
+
+
+class EngagementListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """Resolves the targets of the whole page before any row is rendered."""
 
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        self.child.resolve_targets(items)
+        return super().to_representation(items)
 
-class BookmarkSerializer(serializers.ModelSerializer):
+
+class EngagementSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """The generic-FK shape likes, reposts and bookmarks had before they
+    moved to one table: `content_type` is the target's ContentType id.
+
+    With `?include=target` each row also embeds a summary of the post or
+    comment it points at (null once that is deleted).
+    """
     user = UserSerializer(read_only=True)
+    content_type = serializers.IntegerField(source='content_type_id', read_only=True)
+    object_id = serializers.IntegerField(source='target_id', read_only=True)
+    target = serializers.SerializerMethodField()
 
     class Meta:
+        model = Engagement
+        fields = ['id', 'user', 'content_type', 'object_id', 'created', 'target']
+        list_serializer_class = EngagementListSerializer
+
+    compact_fields = {'user': AuthorSerializer}
+    field_columns = {'content_type': ['target_type'], 'target': ['target_type', 'target_id']}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if "target" not in (requested(self.context.get("request"), "include") or ()):
+            fields.pop("target", None)
+        return fields
+
+    def wants_targets(self):
+        return "target" in self.fields
+
+    def resolve_targets(self, items):
+        if self.wants_targets():
+            resolve_targets(self.context, items, target_querysets())
+
+    def to_representation(self, instance):
+        self.resolve_targets([instance])  # no-op when a list already did it
+        return super().to_representation(instance)
+
+    def get_target(self, obj):
+        target = resolved_target(self.context, obj)
+        if target is None:
+            return None
+        return TARGET_SUMMARIES[obj.target_type](target, context=self.context).data
+
+
+class LikeSerializer(EngagementSerializer):
+    class Meta(EngagementSerializer.Meta):
+        model = Like
+
+
+class RepostSerializer(EngagementSerializer):
+    class Meta(EngagementSerializer.Meta):
+        model = Repost
+
+
+class BookmarkSerializer(EngagementSerializer):
+    class Meta(EngagementSerializer.Meta):
         model = Bookmark
-        fields = ['id', 'user', 'content_type', 'object_id', 'created']
+
+
+class EngagementOperationSerializer(serializers.Serializer):
+    """One entry of a batch engagement request: set `action` on a target to `state`."""
+    action = serializers.ChoiceField(choices=["like", "bookmark", "repost"])
+    target_type = serializers.ChoiceField(choices=["post", "comment"])
+    target_id = serializers.IntegerField(min_value=1)
+    state = serializers.BooleanField()
+
+
+# -----------------------------
+# TIMELINE
+# -----------------------------
+class EmbeddedPostListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """List of rows that each embed a post (timeline entries, trending scores):
+    resolves viewer state for all of the embedded posts up front."""
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        post = self.child.fields["post"]
+        if post.wants_viewer_state():
+            resolve_viewer_state(self.context, Post, [item.post for item in items])
+        return super().to_representation(items)
+
+
+class TimelineEntrySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    post = PostSerializer(read_only=True)
+
+    class Meta:
+        model = TimelineEntry
+        fields = ['id', 'post', 'actor', 'is_repost', 'created_at']
+        list_serializer_class = EmbeddedPostListSerializer
+
+
+# -----------------------------
+# TRENDING
+# -----------------------------
+class TrendingPostSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    post = PostSerializer(read_only=True)
+    score = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PostScore
+        fields = ['post', 'score']
+        list_serializer_class = EmbeddedPostListSerializer
+
+    def get_score(self, obj):
+        return round(current_score(obj.score), 4)
+
+
+class TrendingTagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    name = serializers.CharField(source='tag.name', read_only=True)
+    score = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TagScore
+        fields = ['tag', 'name', 'score']
+
+    def get_score(self, obj):
+        return round(current_score(obj.score), 4)
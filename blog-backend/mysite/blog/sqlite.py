@@ -0,0 +1,24 @@
+"""Per-connection SQLite tuning, applied from the connection_created signal.
+
+journal_mode=WAL lets readers run while a write is in progress and is stored
+in the database file, so it is only set through writable connections. The
+other pragmas are per connection: synchronous=NORMAL is durable under WAL
+except for the last transactions before a power loss, mmap_size serves reads
+from the page cache, and busy_timeout makes a writer wait for the lock instead
+of failing with "database is locked".
+"""
+from django.conf import settings
+
+
+def is_read_only(connection):
+    return "mode=ro" in str(connection.settings_dict["NAME"])
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            if name == "journal_mode" and is_read_only(connection):
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
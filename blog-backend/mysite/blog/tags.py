@@ -0,0 +1,44 @@
+from .models import Post, Tag
+
+PostTag = Post.tags.through
+
+
+def normalize_tags(names):
+    """Trim, collapse inner whitespace and lowercase tag names, dropping
+    empty and duplicate names while keeping the caller's order."""
+    seen = {}
+    for name in names:
+        name = " ".join(name.split()).lower()
+        if name:
+            seen.setdefault(name, None)
+    return list(seen)
+
+
+def set_post_tags(post, names, created=False):
+    """Make `names` the exact tag set of `post`.
+
+    Missing tags are inserted in one conflict-ignoring statement and only the
+    through rows that actually change are written, so this costs at most five
+    queries however many tags there are. Pass `created=True` for a post that
+    cannot have tags yet to skip reading the current set.
+    """
+    names = normalize_tags(names)
+    if names:
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        wanted = set(Tag.objects.filter(name__in=names).values_list("id", flat=True))
+    else:
+        wanted = set()
+
+    current = set() if created else set(
+        PostTag.objects.filter(post_id=post.pk).values_list("tag_id", flat=True)
+    )
+    added, removed = wanted - current, current - wanted
+    if added:
+        PostTag.objects.bulk_create(
+            [PostTag(post_id=post.pk, tag_id=tag_id) for tag_id in added], ignore_conflicts=True,
+        )
+    if removed:
+        PostTag.objects.filter(post_id=post.pk, tag_id__in=removed).delete()
+
+    # Drop a stale prefetch so the response shows the new tags.
+    getattr(post, "_prefetched_objects_cache", {}).pop("tags", None)
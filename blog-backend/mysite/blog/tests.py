@@ -1,3 +1,1121 @@
-from django.test import TestCase
+import contextvars
+import gzip
+import json
+import math
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .counters import counter_expressions
+from .models import User, Post, Comment, Engagement, Bookmark, Like, Repost, Tag, TimelineEntry, PostScore, TagScore, Follow, make_excerpt
+from .pagination import _after
+from .search import search_posts
+from .tags import set_post_tags
+from .threads import subtree_filter
+from .trending import update_scores
+from . import async_views, authentication, export, response_cache, routers, view_counts
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=None)  # tests flush explicitly
+class BlogTestCase(TestCase):
+    def setUp(self):
+        # Cached responses and pending view counts must not leak between
+        # tests that reuse primary keys.
+        cache.clear()
+        authentication.local_users.clear()
+        authentication.local_auth_states.clear()
+        view_counts.counter.pending.drain()
+
+    def tearDown(self):
+        view_counts.counter.pending.drain()
+
+
+class EngagementCounterTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.post = Post.objects.create(author=self.user, title="Hello", content="World")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_toggles_keep_post_counters_in_sync(self):
+        self.client.post(f"/blog/posts/{self.post.id}/like/")
+        self.client.post(f"/blog/posts/{self.post.id}/bookmark/")
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.bookmarks_count), (1, 1))
+
+        self.client.post(f"/blog/posts/{self.post.id}/like/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_comment_delete_removes_replies_from_count(self):
+        root = self.client.post(f"/blog/posts/{self.post.id}/comments/", {"content": "root"}).data
+        self.client.post(f"/blog/posts/{self.post.id}/comments/", {"content": "reply", "parent": root["id"]})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+        self.client.delete(f"/blog/comments/{root['id']}/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_rebuild_counters_recomputes_from_source_rows(self):
+        Like.objects.create(user=self.user, content_object=self.post)
+        Comment.objects.create(post=self.post, author=self.user, content="hi")
+        Post.objects.filter(pk=self.post.pk).update(likes_count=7, comments_count=7)
+
+        call_command("rebuild_counters", chunk_size=1, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+
+
+class PostListQueryCountTests(BlogTestCase):
+    # COUNT for the paginator, the page itself (author joined), the tag prefetch.
+    LIST_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username="bob", password="pw")
+        tags = [Tag.objects.create(name=f"tag{i}") for i in range(3)]
+        posts = Post.objects.bulk_create(
+            Post(author=author, title=f"Post {i}", content="body") for i in range(120)
+        )
+        for post in posts:
+            post.tags.set(tags)
+
+    def test_list_query_count_is_independent_of_page_size(self):
+        for page_size in (10, 100):
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(self.LIST_QUERIES):
+                    response = self.client.get("/blog/posts/", {"page_size": page_size})
+                self.assertEqual(len(response.json()["results"]), page_size)
+                self.assertEqual(response.json()["results"][0]["tags"], ["tag0", "tag1", "tag2"])
+
+
+class CommentThreadTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="carol", password="pw")
+        self.post = Post.objects.create(author=self.user, title="Thread", content="...")
+
+    def reply(self, parent=None, content="c"):
+        return Comment.objects.create(post=self.post, author=self.user, parent=parent, content=content)
+
+    def test_path_and_depth_follow_parent_links(self):
+        root = self.reply()
+        child = self.reply(root)
+        grandchild = self.reply(child)
+        self.assertEqual(grandchild.depth, 2)
+        self.assertTrue(grandchild.path.startswith(child.path))
+        self.assertTrue(child.path.startswith(root.path))
+
+    def test_deep_thread_is_serialized_with_constant_queries(self):
+        root = parent = self.reply()
+        for _ in range(20):
+            parent = self.reply(parent)
+        self.reply(root, content="sibling")
+
+        # The ETag lookup, the comment itself, then its whole subtree in one query.
+        with self.assertNumQueries(3):
+            data = self.client.get(f"/blog/comments/{root.id}/").json()
+
+        self.assertEqual([r["content"] for r in data["replies"]], ["c", "sibling"])
+        node, depth = data, 0
+        while node["replies"]:
+            node, depth = node["replies"][0], depth + 1
+        self.assertEqual(depth, 20)
+
+
+class PostSearchTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username="dave", password="pw")
+
+    def search(self, query):
+        return self.client.get("/blog/posts/", {"search": query}).json()["results"]
+
+    def test_results_are_ranked_and_highlighted(self):
+        body = Post.objects.create(author=self.author, title="Notes", content="a word about caching")
+        title = Post.objects.create(author=self.author, title="Caching guide", content="caching, caching")
+
+        results = self.search("cach")
+        self.assertEqual([r["id"] for r in results], [title.id, body.id])
+        self.assertIn("<mark>caching</mark>", results[1]["snippet"])
+
+    def test_snippets_escape_post_markup(self):
+        Post.objects.create(author=self.author, title="Notes", content='<img src=x onerror="alert(1)"> caching <script>')
+
+        snippet = self.search("caching")[0]["snippet"]
+        self.assertEqual(snippet, '&lt;img src=x onerror=&quot;alert(1)&quot;&gt; <mark>caching</mark> &lt;script&gt;')
+
+    def test_index_follows_updates_and_deletes(self):
+        post = Post.objects.create(author=self.author, title="Old title", content="text")
+        post.title = "Fresh title"
+        post.save()
+        self.assertFalse(search_posts(Post.objects.all(), "old").exists())
+        self.assertEqual(list(search_posts(Post.objects.all(), "fresh")), [post])
+
+        post.delete()
+        self.assertFalse(search_posts(Post.objects.all(), "fresh").exists())
+
+
+class KeysetPaginationTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username="erin", password="pw")
+        self.posts = [Post.objects.create(author=self.author, title=f"P{i}", content="x") for i in range(25)]
+
+    def test_cursor_pages_are_stable_under_inserts(self):
+        first = self.client.get("/blog/posts/", {"pagination": "cursor"}).json()
+        self.assertNotIn("count", first)
+        Post.objects.create(author=self.author, title="Newer", content="x")
+
+        seen = [r["id"] for r in first["results"]]
+        url = first["next"]
+        while url:
+            page = self.client.get(url).json()
+            seen += [r["id"] for r in page["results"]]
+            url = page["next"]
+        self.assertEqual(seen, [post.id for post in reversed(self.posts)])
+
+    def test_previous_link_returns_the_prior_page(self):
+        first = self.client.get("/blog/posts/", {"pagination": "cursor"}).json()
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+
+    def test_page_numbers_remain_the_default(self):
+        self.assertEqual(self.client.get("/blog/posts/").json()["count"], 25)
+
+    def test_bad_cursor_is_rejected(self):
+        self.assertEqual(self.client.get("/blog/posts/", {"cursor": "nope"}).status_code, 404)
+
+
+class TimelineTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user(username="reader", password="pw")
+        self.author = User.objects.create_user(username="writer", password="pw")
+        self.client = APIClient()
+
+    def as_user(self, user):
+        self.client.force_authenticate(user)
+        return self.client
+
+    def timeline_ids(self):
+        return [e["post"]["id"] for e in self.as_user(self.reader).get("/blog/timeline/").json()["results"]]
+
+    def publish(self, title):
+        return self.as_user(self.author).post("/blog/posts/", {"title": title, "content": "x"}).json()["id"]
+
+    def test_fan_out_on_write_and_unfollow(self):
+        old = Post.objects.create(author=self.author, title="Before", content="x")
+        self.as_user(self.reader).post(f"/blog/users/{self.author.id}/follow/")
+        new = self.publish("After")
+        self.assertEqual(self.timeline_ids(), [new, old.id])
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+        self.as_user(self.reader).delete(f"/blog/users/{self.author.id}/follow/")
+        self.assertEqual(self.timeline_ids(), [])
+
+    def test_reposts_reach_followers(self):
+        other = User.objects.create_user(username="other", password="pw")
+        post = Post.objects.create(author=other, title="Shared", content="x")
+        self.as_user(self.reader).post(f"/blog/users/{self.author.id}/follow/")
+        self.as_user(self.author).post(f"/blog/posts/{post.id}/repost/")
+        entry = self.as_user(self.reader).get("/blog/timeline/").json()["results"][0]
+        self.assertEqual((entry["post"]["id"], entry["actor"], entry["is_repost"]), (post.id, self.author.id, True))
+
+    def test_pull_authors_are_merged_on_read(self):
+        self.as_user(self.reader).post(f"/blog/users/{self.author.id}/follow/")
+        self.author.refresh_from_db()
+        with self.settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0):
+            post_id = self.publish("Celebrity post")
+            self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+            self.assertEqual(self.timeline_ids(), [post_id])
+
+    def test_timeline_is_capped(self):
+        self.as_user(self.reader).post(f"/blog/users/{self.author.id}/follow/")
+        ids = [self.publish(f"P{i}") for i in range(5)]
+        with self.settings(TIMELINE_MAX_ENTRIES=3):
+            self.assertEqual(self.timeline_ids(), ids[:-4:-1])
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 3)
+
+    def test_unread_timelines_are_capped_on_write(self):
+        self.as_user(self.reader).post(f"/blog/users/{self.author.id}/follow/")
+        with self.settings(TIMELINE_MAX_ENTRIES=3, TIMELINE_TRIM_SLACK=2):
+            ids = [self.publish(f"P{i}") for i in range(8)]
+        entries = TimelineEntry.objects.filter(user=self.reader).order_by("-created_at", "-id")
+        self.assertLessEqual(entries.count(), 5)
+        self.assertEqual(list(entries.values_list("post_id", flat=True)[:3]), ids[:-4:-1])
+
+
+class ResponseCacheTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="frank", password="pw")
+        self.post = Post.objects.create(author=self.user, title="Cached", content="x")
+        self.writer = APIClient()
+        self.writer.force_authenticate(self.user)
+
+    def test_detail_is_served_from_cache_until_engagement_changes(self):
+        url = f"/blog/posts/{self.post.id}/"
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        with self.assertNumQueries(1):  # only the ETag's updated_at lookup
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writer.post(f"/blog/posts/{self.post.id}/like/")
+        response = self.client.get(url)
+        self.assertEqual((response["X-Cache"], response.json()["likes_count"]), ("MISS", 1))
+
+    def test_list_pages_are_invalidated_by_new_posts(self):
+        self.client.get("/blog/posts/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writer.post("/blog/posts/", {"title": "Another", "content": "y"})
+        response = self.client.get("/blog/posts/")
+        self.assertEqual((response["X-Cache"], response.json()["count"]), ("MISS", 2))
+        self.assertEqual(response_cache.stats()["post-list"], {"hit": 0, "stale": 0, "miss": 2})
+
+    def test_authenticated_reads_bypass_the_cache(self):
+        self.assertNotIn("X-Cache", self.writer.get(f"/blog/posts/{self.post.id}/"))
+
+
+class ConditionalGetTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="gina", password="pw")
+        self.post = Post.objects.create(author=self.user, title="Polled", content="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_matching_etag_returns_304_without_serializing(self):
+        for url in (f"/blog/posts/{self.post.id}/", f"/blog/posts/{self.post.id}/comments/", "/blog/posts/"):
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                with self.assertNumQueries(1 if url.endswith(f"{self.post.id}/") else 0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_new_comment_changes_the_etag(self):
+        url = f"/blog/posts/{self.post.id}/comments/"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {"content": "hi"})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_revalidations_count_as_views(self):
+        url = f"/blog/posts/{self.post.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(view_counts.counter.pending_for(self.post.id), 2)
+        self.client.put(url, {"title": "Edited"}, format="json")
+        self.assertEqual(view_counts.counter.pending_for(self.post.id), 2)
+
+    def test_flushed_views_change_the_post_etag(self):
+        url = f"/blog/posts/{self.post.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        view_counts.counter.flush()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["views_count"], 2)  # the first view and the 304, both flushed
+
+
+class ViewerStateTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="hank", password="pw")
+        self.posts = Post.objects.bulk_create(
+            Post(author=self.user, title=f"P{i}", content="x") for i in range(100)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_viewer_state_costs_one_query_for_every_engagement_type(self):
+        self.client.post(f"/blog/posts/{self.posts[0].id}/like/")
+        for page_size in (10, 100):
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(PostListQueryCountTests.LIST_QUERIES + 1):
+                    results = self.client.get("/blog/posts/", {"page_size": page_size}).json()["results"]
+                liked = [r["is_liked"] for r in results if r["id"] == self.posts[0].id]
+                self.assertEqual(liked, [True])
+                self.assertEqual(sum(r["is_liked"] for r in results), 1)
+
+    def test_replies_are_covered_by_the_page_lookup(self):
+        post = self.posts[0]
+        root = Comment.objects.create(post=post, author=self.user, content="root")
+        reply = Comment.objects.create(post=post, author=self.user, parent=root, content="reply")
+        self.client.post(f"/blog/comments/{reply.id}/like/")
+
+        with self.assertNumQueries(3 + 1):  # ETag lookup, comment, subtree, then state
+            data = self.client.get(f"/blog/comments/{root.id}/").json()
+        self.assertEqual((data["is_liked"], data["replies"][0]["is_liked"]), (False, True))
+
+    def test_anonymous_viewers_get_false_without_queries(self):
+        with self.assertNumQueries(PostListQueryCountTests.LIST_QUERIES):
+            results = APIClient().get("/blog/posts/").json()["results"]
+        self.assertFalse(any(r["is_liked"] or r["is_reposted"] or r["is_bookmarked"] for r in results))
+
+
+class EngagementBatchTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="iris", password="pw")
+        self.post = Post.objects.create(author=self.user, title="Batch", content="x")
+        self.comment = Comment.objects.create(post=self.post, author=self.user, content="c")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, *operations):
+        return self.client.post("/blog/engagements/batch/", {"operations": list(operations)}, format="json")
+
+    def test_batch_sets_states_and_returns_counts(self):
+        response = self.batch(
+            {"action": "like", "target_type": "post", "target_id": self.post.id, "state": True},
+            {"action": "bookmark", "target_type": "comment", "target_id": self.comment.id, "state": True},
+        )
+        self.assertEqual([(r["state"], r["count"]) for r in response.json()["results"]], [(True, 1), (True, 1)])
+
+        # Setting the same state again is a no-op, not a toggle.
+        response = self.batch({"action": "like", "target_type": "post", "target_id": self.post.id, "state": True})
+        self.assertEqual(response.json()["results"][0]["count"], 1)
+        self.assertEqual(Like.objects.count(), 1)
+
+        self.batch({"action": "like", "target_type": "post", "target_id": self.post.id, "state": False})
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, Like.objects.count()), (0, 0))
+
+    def test_unknown_targets_reject_the_whole_batch(self):
+        response = self.batch(
+            {"action": "like", "target_type": "post", "target_id": self.post.id, "state": True},
+            {"action": "like", "target_type": "post", "target_id": 999, "state": True},
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+    def test_single_object_views_keep_their_responses(self):
+        self.assertIn("detail", self.client.post(f"/blog/posts/{self.post.id}/like/").json())
+        self.assertEqual(self.client.post(f"/blog/posts/{self.post.id}/like/").json(), {"detail": "Unliked"})
+        self.assertEqual(self.client.post(f"/blog/comments/{self.comment.id}/like/").status_code, 200)
+        self.assertEqual(self.client.post(f"/blog/comments/{self.comment.id}/like/").status_code, 400)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 1)
+
+
+class PostTagWriteTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="jack", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_tags_are_normalized_and_deduplicated(self):
+        data = self.client.post(
+            "/blog/posts/", {"title": "T", "content": "x", "tags": ["Django", " django ", "Web  Dev"]}, format="json",
+        ).json()
+        self.assertEqual(sorted(data["tags"]), ["django", "web dev"])
+
+    def test_existing_case_duplicates_are_merged(self):
+        old, spaced, lower = (Tag.objects.create(name=name) for name in ("Python", "PYTHON ", "python"))
+        first = Post.objects.create(author=self.user, title="A", content="x")
+        second = Post.objects.create(author=self.user, title="B", content="x")
+        first.tags.add(old, lower)
+        second.tags.add(old, spaced)
+        TagScore.objects.create(tag=old, score=1.0)
+        TagScore.objects.create(tag=lower, score=1.0)
+
+        import_module("blog.migrations.0016_normalize_tag_names").merge_case_duplicates(django_apps, None)
+        self.assertEqual(list(Tag.objects.values_list("name", flat=True)), ["python"])
+        self.assertEqual(sorted(Post.tags.through.objects.values_list("post_id", "tag_id")),
+                         [(first.id, lower.id), (second.id, lower.id)])
+        self.assertAlmostEqual(TagScore.objects.get().score, 1.0 + math.log(2))
+
+    def test_update_writes_only_the_difference_in_fixed_queries(self):
+        post = Post.objects.create(author=self.user, title="T", content="x")
+        set_post_tags(post, ["keep", "drop"], created=True)
+        for count in (2, 20):
+            tags = ["keep"] + [f"new{count}-{i}" for i in range(count)]
+            with self.subTest(tags=count):
+                # Insert missing tags, read their ids, read current links, add, remove.
+                with self.assertNumQueries(5):
+                    set_post_tags(post, tags)
+                self.assertEqual(sorted(post.tags.values_list("name", flat=True)), sorted(tags))
+
+
+class TrendingTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="kate", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_engagement_ranks_posts_and_is_only_counted_once(self):
+        quiet = Post.objects.create(author=self.user, title="Quiet", content="x")
+        busy = Post.objects.create(author=self.user, title="Busy", content="x")
+        set_post_tags(busy, ["django"], created=True)
+        self.client.post(f"/blog/posts/{busy.id}/like/")
+        self.client.post(f"/blog/posts/{busy.id}/comments/", {"content": "nice"})
+        update_scores()
+        first = PostScore.objects.get(post=busy).score
+        update_scores()
+        self.assertEqual(PostScore.objects.get(post=busy).score, first)
+
+        results = self.client.get("/blog/trending/posts/").json()["results"]
+        self.assertEqual([row["post"]["id"] for row in results], [busy.id, quiet.id])
+        self.assertTrue(results[0]["post"]["is_liked"])
+        self.assertGreater(results[0]["score"], results[1]["score"])
+
+        tags = self.client.get("/blog/trending/tags/").json()["results"]
+        self.assertEqual([row["name"] for row in tags], ["django"])
+
+    def test_tags_added_to_an_existing_post_are_scored(self):
+        post = Post.objects.create(author=self.user, title="Tagged later", content="x")
+        set_post_tags(post, ["django"], created=True)
+        update_scores()
+        first = TagScore.objects.get(tag__name="django").score
+        self.client.put(f"/blog/posts/{post.id}/", {"tags": ["django", "python"]}, format="json")
+        update_scores()
+        self.assertTrue(TagScore.objects.filter(tag__name="python").exists())
+        self.assertEqual(TagScore.objects.get(tag__name="django").score, first)
+
+        other = Post.objects.create(author=self.user, title="Another", content="x")
+        update_scores()
+        set_post_tags(other, ["django"])
+        update_scores()
+        self.assertGreater(TagScore.objects.get(tag__name="django").score, first)
+
+    def test_old_events_are_pruned(self):
+        post = Post.objects.create(author=self.user, title="Old", content="x")
+        Post.objects.filter(pk=post.pk).update(created_at=post.created_at.replace(year=post.created_at.year - 1))
+        self.assertEqual(update_scores()["pruned"], 1)
+        self.assertFalse(PostScore.objects.exists())
+
+
+class AsyncReadViewTests(BlogTestCase):
+    """The async views must answer exactly like the sync ones; any query they
+    left to the serializers would raise SynchronousOnlyOperation here."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="liam", password="pw")
+        self.post = Post.objects.create(author=self.user, title="Hello", content="x")
+        set_post_tags(self.post, ["django"], created=True)
+        root = Comment.objects.create(post=self.post, author=self.user, content="root")
+        Comment.objects.create(post=self.post, author=self.user, content="reply", parent=root)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.post(f"/blog/posts/{self.post.id}/like/")
+        self.client.post(f"/blog/comments/{root.id}/like/")
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def call(self, view, path, *args, **headers):
+        request = AsyncRequestFactory().get(path, headers=headers)
+        return async_to_sync(view)(request, *args)
+
+    def test_reads_match_the_sync_views(self):
+        cases = [
+            (async_views.post_list_create, "/blog/posts/", ()),
+            (async_views.post_list_create, "/blog/posts/?pagination=cursor", ()),
+            (async_views.post_detail, f"/blog/posts/{self.post.id}/", (self.post.id,)),
+            (async_views.comment_list_create, f"/blog/posts/{self.post.id}/comments/", (self.post.id,)),
+            (async_views.like_list, "/blog/likes/", ()),
+            (async_views.like_list, "/blog/likes/?include=target", ()),
+        ]
+        for view, path, args in cases:
+            for headers in ({}, {"Authorization": f"Bearer {self.token}"}):
+                with self.subTest(path=path, authenticated=bool(headers)):
+                    # Each detail GET records a view; compare both from the same count.
+                    view_counts.counter.pending.drain()
+                    expected = APIClient().get(path, headers=headers)
+                    view_counts.counter.pending.drain()
+                    response = self.call(view, path, *args, **headers)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(json.loads(response.content), expected.json())
+                    self.assertEqual(response.get("ETag"), expected.get("ETag"))
+
+    def test_conditional_get_and_errors(self):
+        path = f"/blog/posts/{self.post.id}/"
+        etag = self.call(async_views.post_detail, path, self.post.id)["ETag"]
+        response = self.call(async_views.post_detail, path, self.post.id, If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(view_counts.counter.pending_for(self.post.id), 2)
+
+        response = self.call(async_views.post_detail, "/blog/posts/999/", 999)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(view_counts.counter.pending_for(999), 0)
+        response = self.call(async_views.post_list_create, "/blog/posts/", Authorization="Bearer nope")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.content)["code"], "token_not_valid")
+
+    def test_writes_fall_through_to_the_sync_view(self):
+        request = AsyncRequestFactory().post(
+            "/blog/posts/", {"title": "New", "content": "y"}, content_type="application/json",
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
+        response = async_to_sync(async_views.post_list_create)(request)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Post.objects.filter(title="New").exists())
+
+
+class ViewCountTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="mia", password="pw")
+        self.posts = [Post.objects.create(author=self.user, title=f"P{i}", content="x") for i in range(3)]
+
+    def test_views_are_counted_in_memory_and_flushed_in_one_update(self):
+        client = APIClient()
+        for post, hits in zip(self.posts, (3, 1, 0)):
+            for _ in range(hits):
+                client.get(f"/blog/posts/{post.id}/")
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].views_count, 0)
+        self.assertEqual(client.get(f"/blog/posts/{self.posts[1].id}/?fresh").json()["views_count"], 1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(view_counts.counter.flush(), 2)
+        counts = dict(Post.objects.values_list("pk", "views_count"))
+        self.assertEqual([counts[post.pk] for post in self.posts], [3, 2, 0])
+        self.assertEqual(view_counts.counter.flush(), 0)
+
+    def test_sharded_counter_is_exact_across_threads(self):
+        shared = view_counts.ShardedCounter()
+
+        def hit():
+            for i in range(1000):
+                shared.add(i % 3)
+
+        threads = [threading.Thread(target=hit) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(shared.drain(), {0: 2672, 1: 2664, 2: 2664})
+        self.assertEqual(shared.drain(), {})
+
+
+class DatabaseRoutingTests(SimpleTestCase):
+    def test_reads_use_the_replica_until_the_request_writes(self):
+        router = routers.PrimaryReplicaRouter()
+
+        def request():
+            reads = [router.db_for_read(Post)]
+            self.assertEqual(router.db_for_write(Post), "default")
+            reads.append(router.db_for_read(Post))
+            return reads
+
+        self.assertEqual(contextvars.Context().run(request), ["replica", "default"])
+        self.assertEqual(router.allow_migrate("replica", "blog"), False)
+
+
+class PrimaryPinningTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="nora", password="pw")
+        self.post = Post.objects.create(author=self.user, title="T", content="x")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def pinned_during(self, **headers):
+        seen = []
+        middleware = routers.PrimaryPinningMiddleware(lambda request: seen.append(routers._pinned.get()))
+        middleware(RequestFactory().get("/blog/posts/", **headers))
+        return seen[0]
+
+    def test_a_write_pins_that_users_reads_to_the_primary(self):
+        self.assertFalse(self.pinned_during(**self.auth))
+        APIClient().post(f"/blog/posts/{self.post.id}/like/", **self.auth)
+        self.assertTrue(self.pinned_during(**self.auth))
+        self.assertFalse(self.pinned_during())
+
+    def test_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+def recounted(model):
+    # counter_expressions() under names that do not clash with the stored fields.
+    return {f"new_{field}": expression for field, expression in counter_expressions(model).items()}
+
+
+class QueryPlanTests(BlogTestCase):
+    """EXPLAIN QUERY PLAN for the hot queries behind views.py and
+    serializers.py: none may scan a whole table, or sort rows that an index
+    could have returned in order."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="olga", password="pw")
+        self.post = Post.objects.create(author=self.user, title="Hello", content="x")
+        self.comment = Comment.objects.create(post=self.post, author=self.user, content="c")
+
+    def assertIndexed(self, queryset, sorts=False):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            detail = line.split(" ", 3)[-1]
+            self.assertFalse(re.fullmatch(r"SCAN \w+", detail), f"full table scan:\n{plan}")
+            if not sorts:
+                self.assertNotIn("TEMP B-TREE FOR ORDER BY", detail, f"unindexed sort:\n{plan}")
+
+    def test_hot_queries_use_indexes(self):
+        newest = ("-created_at", "-id")
+        position = (datetime(2025, 1, 1, tzinfo=timezone.utc), self.post.id)
+        queries = {
+            "post list": Post.objects.select_related("author").order_by(*newest)[:11],
+            "post list, next page": Post.objects.filter(_after(newest, position)).order_by(*newest)[:11],
+            "post list by author": Post.objects.filter(author__id=self.user.id).order_by(*newest)[:11],
+            "post detail": Post.objects.select_related("author").filter(pk=self.post.id),
+            "post tags": Tag.objects.filter(posts__in=[self.post.id]),
+            "post counters": Post.objects.filter(pk__in=[self.post.id]).values(**recounted(Post)),
+            "viewer state": Engagement.objects.filter(
+                user=self.user, target_type=Engagement.TargetType.POST, target_id__in=[self.post.id],
+            ).values_list("kind", "target_id"),
+            "comment list": Comment.objects.filter(post_id=self.post.id).order_by("created_at", "id")[:11],
+            "comment thread": Comment.objects.filter(
+                post_id=self.post.id, **subtree_filter(self.comment.path),
+            ).order_by("path"),
+            "comment counters": Comment.objects.filter(pk__in=[self.comment.id]).values(**recounted(Comment)),
+            "likes of a post": Like.objects.filter(
+                target_type=Engagement.TargetType.POST, target_id=self.post.id,
+            ).order_by("-created", "-id")[:11],
+            "like list": Like.objects.order_by("-created", "-id")[:11],
+            "likes by user": Like.objects.filter(user__id=self.user.id).order_by("-created", "-id")[:11],
+            "home timeline": TimelineEntry.objects.filter(user=self.user).order_by(*newest)[:11],
+            "followers": Follow.objects.filter(following=self.user).values_list("follower_id", flat=True),
+            "trending posts": PostScore.objects.order_by("-score")[:10],
+        }
+        for name, queryset in queries.items():
+            with self.subTest(name):
+                self.assertIndexed(queryset)
+
+    def test_search_reads_the_full_text_index(self):
+        # Relevance order can only be computed per match, so the sort is expected.
+        self.assertIndexed(search_posts(Post.objects.all(), "hello"), sorts=True)
+
+
+class RequestMetricsTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="pia", password="pw")
+        self.post = Post.objects.create(author=self.user, title="T", content="x")
+
+    def timings(self, response):
+        return {
+            part.split(";")[0].strip(): part
+            for part in response["Server-Timing"].split(",")
+        }
+
+    def test_server_timing_counts_the_requests_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = APIClient().get(f"/blog/posts/{self.post.id}/")
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {"db", "serialize", "total"})
+        self.assertIn(f'desc="{len(captured)} queries"', timings["db"])
+
+    def test_serialize_covers_building_the_data(self):
+        def slow_pending_for(post_id):
+            time.sleep(0.05)
+            return 0
+
+        with mock.patch.object(view_counts.counter, "pending_for", slow_pending_for):
+            response = APIClient().get(f"/blog/posts/{self.post.id}/")
+        duration = float(self.timings(response)["serialize"].split("dur=")[1])
+        self.assertGreaterEqual(duration, 50)
+
+    def test_metrics_endpoint_serves_histograms_per_view(self):
+        APIClient().get("/blog/posts/")
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn("# TYPE blog_request_duration_seconds histogram", body)
+        self.assertRegex(body, r'blog_request_queries_count\{view="post-list-create"\} [1-9]')
+        self.assertIn('blog_request_serialize_seconds_bucket{view="post-list-create",le="+Inf"}', body)
+        with override_settings(METRICS_ALLOWED_IPS=["10.0.0.1"]):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    def test_slow_requests_log_their_slowest_queries(self):
+        with override_settings(SLOW_REQUEST_MS=0), self.assertLogs("blog.metrics", "WARNING") as logs:
+            APIClient().get(f"/blog/posts/{self.post.id}/")
+        self.assertIn("post-detail", logs.output[0])
+        self.assertIn('FROM "blog_post"', logs.output[0])
+
+
+class SparseFieldsetTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="quinn", password="pw", bio="A long bio", full_name="Quinn")
+        self.post = Post.objects.create(author=self.user, title="Hello", content="word " * 200)
+        set_post_tags(self.post, ["django"], created=True)
+        self.comment = Comment.objects.create(post=self.post, author=self.user, content="root")
+        Comment.objects.create(post=self.post, author=self.user, content="reply", parent=self.comment)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.post(f"/blog/posts/{self.post.id}/like/")
+
+    def test_lists_show_excerpts_and_compact_authors(self):
+        post = self.client.get("/blog/posts/").json()["results"][0]
+        self.assertNotIn("content", post)
+        self.assertEqual(post["excerpt"], make_excerpt(self.post.content))
+        self.assertEqual(set(post["author"]), {"id", "username", "full_name", "avatar_url"})
+        self.assertTrue(post["is_liked"])
+
+        detail = self.client.get(f"/blog/posts/{self.post.id}/").json()
+        self.assertEqual(detail["content"], self.post.content)
+        self.assertEqual(detail["author"]["bio"], "A long bio")
+        self.assertNotIn("password", detail["author"])
+
+        reply = self.client.get(f"/blog/posts/{self.post.id}/comments/").json()["results"][0]["replies"][0]
+        self.assertEqual(set(reply["author"]), {"id", "username", "full_name", "avatar_url"})
+        like = self.client.get("/blog/likes/").json()["results"][0]
+        self.assertEqual(set(like["user"]), {"id", "username", "full_name", "avatar_url"})
+
+    def test_expand_restores_the_full_representation(self):
+        post = self.client.get("/blog/posts/?expand=author,content").json()["results"][0]
+        self.assertEqual(post["content"], self.post.content)
+        self.assertEqual(post["author"]["bio"], "A long bio")
+        self.assertNotIn("password", post["author"])
+
+    def test_fields_limit_the_output_and_the_columns_loaded(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/blog/posts/?fields=title,tags")
+        self.assertEqual(response.json()["results"], [
+            {"id": self.post.id, "title": "Hello", "tag_list": ["django"], "tags": ["django"]},
+        ])
+        page_query = next(q["sql"] for q in captured if 'FROM "blog_post"' in q["sql"] and "LIMIT" in q["sql"])
+        self.assertNotIn('"content"', page_query)
+        self.assertNotIn('"blog_user"', page_query)
+        # No viewer state was asked for, so none is looked up.
+        self.assertFalse(any('FROM "blog_like"' in q["sql"] for q in captured))
+
+        comments = self.client.get(f"/blog/posts/{self.post.id}/comments/?fields=content").json()["results"]
+        self.assertEqual(comments[0], {"id": self.comment.id, "content": "root"})
+
+    def test_excerpt_follows_the_content(self):
+        self.client.put(f"/blog/posts/{self.post.id}/", {"content": "Fresh\n\n  text"}, format="json")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.excerpt, "Fresh text")
+
+
+class ExportTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username="root", password="pw", is_staff=True)
+        self.posts = [Post.objects.create(author=self.admin, title=f"P{i}", content="x") for i in range(5)]
+        set_post_tags(self.posts[0], ["django", "api"], created=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.client.post(f"/blog/posts/{self.posts[0].id}/like/")
+
+    def rows(self, response):
+        body = b"".join(response.streaming_content)
+        if response.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return [json.loads(line) for line in body.decode().splitlines()]
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_streams_every_row_in_id_order(self):
+        response = self.client.get("/blog/export/posts/")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = self.rows(response)
+        self.assertEqual([row["id"] for row in rows], [post.id for post in self.posts])
+        self.assertEqual(rows[0]["tags"], ["api", "django"])
+
+        like = self.rows(self.client.get("/blog/export/likes/"))[0]
+        self.assertEqual((like["target_type"], like["object_id"]), ("post", self.posts[0].id))
+
+    def test_watermarks_and_gzip(self):
+        response = self.client.get(f"/blog/export/posts/?since_id={self.posts[2].id}", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        rows = self.rows(response)
+        self.assertEqual([row["id"] for row in rows], [post.id for post in self.posts[3:]])
+
+        Post.objects.filter(pk=self.posts[1].pk).update(updated_at=datetime(2100, 1, 1, tzinfo=timezone.utc))
+        rows = self.rows(self.client.get("/blog/export/posts/", {"since": "2099-01-01T00:00:00Z"}))
+        self.assertEqual([row["id"] for row in rows], [self.posts[1].id])
+        self.assertEqual(self.client.get("/blog/export/posts/?since=yesterday").status_code, 400)
+
+    def test_admins_only(self):
+        self.client.force_authenticate(User.objects.create_user(username="pat", password="pw"))
+        self.assertEqual(self.client.get("/blog/export/posts/").status_code, 403)
+
+
+class BulkLoadTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username="rae", password="pw", bio="bio")
+        self.fan = User.objects.create_user(username="sol", password="pw")
+        self.post = Post.objects.create(author=self.author, title="Imported gardens", content="Tulips " * 50)
+        set_post_tags(self.post, ["garden"], created=True)
+        root = Comment.objects.create(post=self.post, author=self.fan, content="root")
+        self.reply = Comment.objects.create(post=self.post, author=self.author, content="reply", parent=root)
+        client = APIClient()
+        client.force_authenticate(self.fan)
+        client.post(f"/blog/posts/{self.post.id}/like/")
+        client.post(f"/blog/comments/{self.reply.id}/like/")
+
+    def test_exports_import_back_with_everything_derived_rebuilt(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for kind in ("users", "posts", "comments", "likes"):
+                paths[kind] = f"{directory}/{kind}.jsonl"
+                with open(paths[kind], "wb") as out:
+                    out.writelines(export.ndjson(kind))
+            User.objects.all().delete()  # cascades to everything else
+            call_command("import_jsonl", **paths, stdout=StringIO())
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.author.username, "rae")
+        self.assertEqual(post.created_at, self.post.created_at)
+        self.assertEqual((post.likes_count, post.comments_count), (1, 2))
+        self.assertEqual([tag.name for tag in post.tags.all()], ["garden"])
+        reply = Comment.objects.get(pk=self.reply.pk)
+        self.assertEqual((reply.path, reply.depth, reply.likes_count), (self.reply.path, 1, 1))
+        self.assertFalse(User.objects.get(username="sol").has_usable_password())
+        self.assertEqual(list(search_posts(Post.objects.all(), "tulips")), [post])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'blog_post_created_idx'")
+            self.assertIsNotNone(cursor.fetchone())
+
+    def test_generator_builds_a_consistent_dataset(self):
+        call_command(
+            "generate_data", users=8, posts=20, tags=4, commented_posts=3, comments_per_post=6, likes=60,
+            bookmarks=10, reposts=10, follows=3, username_prefix="gen", stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.filter(username__startswith="gen").count(), 8)
+        for reply in Comment.objects.filter(parent__isnull=False).select_related("parent"):
+            self.assertEqual(reply.path, reply.parent.path + Comment.path_segment(reply.pk))
+        for row in Post.objects.values("likes_count", "comments_count", **recounted(Post)):
+            self.assertEqual(row["likes_count"], row["new_likes_count"])
+            self.assertEqual(row["comments_count"], row["new_comments_count"])
+
+
+class AuthUserCacheTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="ivy", password="pw", full_name="Ivy")
+        self.other = User.objects.create_user(username="oak", password="pw")
+        self.post = Post.objects.create(author=self.other, title="T", content="x")
+        self.client = APIClient(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def user_queries(self, method, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path)
+        return response, [q["sql"] for q in queries if 'FROM "blog_user"' in q["sql"]]
+
+    @override_settings(JWT_USER_CACHE="default")
+    def test_the_user_is_loaded_once(self):
+        response, queries = self.user_queries("get", "/blog/me/")
+        self.assertEqual(len(queries), 1)
+        response, queries = self.user_queries("get", "/blog/me/")
+        self.assertEqual(queries, [])
+        self.assertEqual(response.json()["full_name"], "Ivy")
+
+        authentication.local_users.clear()  # as in another process
+        self.assertEqual(self.user_queries("get", "/blog/me/")[1], [])
+
+    def test_saving_the_user_invalidates_it(self):
+        self.client.get("/blog/me/")
+        self.user.full_name = "Ivy Green"
+        self.user.save()
+        self.assertEqual(self.client.get("/blog/me/").json()["full_name"], "Ivy Green")
+
+        self.user.set_password("new")
+        self.user.save()
+        self.assertIsNone(authentication.local_users.get(self.user.pk))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/blog/me/").status_code, 401)
+
+    def test_follow_counters_are_not_served_stale(self):
+        self.client.get("/blog/me/")
+        self.client.post(f"/blog/users/{self.other.id}/follow/")
+        self.assertEqual(self.client.get("/blog/me/").json()["following_count"], 1)
+
+    def test_reads_use_a_claims_user(self):
+        self.client.post(f"/blog/posts/{self.post.id}/like/")
+        authentication.local_auth_states.clear()
+        cache.clear()
+        response, queries = self.user_queries("get", "/blog/posts/")
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"blog_user"."username"', queries[0])  # the auth state, not the row
+        self.assertTrue(response.json()["results"][0]["is_liked"])
+        self.assertIs(response.wsgi_request.user.save, authentication._read_only)
+
+        with override_settings(JWT_CLAIMS_USER_ON_READS=False):
+            response = self.client.get("/blog/likes/")
+        self.assertIsNot(response.wsgi_request.user.save, authentication._read_only)
+
+    def test_claims_read_query_count(self):
+        self.client.post(f"/blog/posts/{self.post.id}/like/")
+        with self.assertNumQueries(1 + 2):  # auth state, then count and page
+            self.assertEqual(self.client.get("/blog/likes/").status_code, 200)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get("/blog/likes/").status_code, 200)
+
+    def test_claims_reads_still_check_the_user(self):
+        self.assertEqual(self.client.get("/blog/likes/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/blog/likes/").status_code, 401)
+        self.assertEqual(self.client.get("/blog/posts/").status_code, 401)
+
+    def test_claims_reads_reject_revoked_tokens(self):
+        # simplejwt rebinds its settings on setting_changed, which modules that
+        # imported them never see, so switch the check on in place.
+        with mock.patch.object(authentication.api_settings, "CHECK_REVOKE_TOKEN", True):
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+            self.assertEqual(self.client.get("/blog/likes/").status_code, 200)
+            self.user.set_password("new")
+            self.user.save()
+            self.assertEqual(self.client.get("/blog/likes/").status_code, 401)
+
+    def test_a_claims_user_cannot_be_saved(self):
+        token = RefreshToken.for_user(self.user).access_token
+        user = authentication.claims_user(token)
+        self.assertEqual(user, self.user)
+        with self.assertRaises(authentication.ClaimsUserWriteError):
+            user.save()
+        with self.assertRaises(authentication.ClaimsUserWriteError):
+            user.delete()
+
+
+class EngagementStoreTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="wren", password="pw")
+        self.post = Post.objects.create(author=self.user, title="T", content="x")
+        self.comment = Comment.objects.create(post=self.post, author=self.user, content="c")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_kinds_share_one_table(self):
+        self.client.post(f"/blog/posts/{self.post.id}/like/")
+        self.client.post(f"/blog/posts/{self.post.id}/bookmark/")
+        self.client.post(f"/blog/comments/{self.comment.id}/like/")
+        self.assertEqual(Engagement.objects.count(), 3)
+        self.assertEqual((Like.objects.count(), Bookmark.objects.count(), Repost.objects.count()), (2, 1, 0))
+        self.assertEqual(Like.objects.get(target_type=Engagement.TargetType.COMMENT).content_object, self.comment)
+
+    def test_responses_keep_the_generic_shape(self):
+        row = self.client.post(f"/blog/comments/{self.comment.id}/like/").json()
+        self.assertEqual(
+            (row["content_type"], row["object_id"]), (ContentType.objects.get_for_model(Comment).pk, self.comment.id),
+        )
+        self.client.post(f"/blog/posts/{self.post.id}/like/")
+        likes = self.client.get("/blog/likes/", {"type": "post", "object_id": self.post.id}).json()["results"]
+        self.assertEqual([like["object_id"] for like in likes], [self.post.id])
+        self.assertEqual(set(likes[0]), {"id", "user", "content_type", "object_id", "created"})
+        self.assertEqual(self.client.get("/blog/likes/", {"type": "user", "object_id": 1}).json()["results"], [])
+
+
+class EngagementTargetTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="moss", password="pw", full_name="Moss")
+        self.posts = [Post.objects.create(author=self.user, title=f"P{i}", content="body " * 100) for i in range(6)]
+        self.comment = Comment.objects.create(post=self.posts[0], author=self.user, content="nice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for post in self.posts:
+            self.client.post(f"/blog/posts/{post.id}/bookmark/")
+        self.client.post(f"/blog/comments/{self.comment.id}/bookmark/")
+
+    def bookmarks(self, **params):
+        return self.client.get("/blog/bookmarks/", {"include": "target", **params}).json()["results"]
+
+    def test_targets_are_embedded_as_summaries(self):
+        rows = {(row["content_type"], row["object_id"]): row["target"] for row in self.bookmarks()}
+        post = rows[(ContentType.objects.get_for_model(Post).pk, self.posts[1].id)]
+        self.assertEqual(post["title"], "P1")
+        self.assertEqual(post["author"]["username"], "moss")
+        self.assertNotIn("content", post)
+        comment = rows[(ContentType.objects.get_for_model(Comment).pk, self.comment.id)]
+        self.assertEqual((comment["post"], comment["content"]), (self.posts[0].id, "nice"))
+        self.assertNotIn("target", self.client.get("/blog/bookmarks/").json()["results"][0])
+
+    def test_one_query_per_target_type(self):
+        for page_size in (2, 7):
+            with self.subTest(page_size=page_size):
+                with CaptureQueriesContext(connection) as queries:
+                    self.bookmarks(page_size=page_size)
+                targets = [q["sql"] for q in queries if 'FROM "blog_post"' in q["sql"] or 'FROM "blog_comment"' in q["sql"]]
+                self.assertEqual(len(targets), 2 if page_size == 7 else 1)
+
+    def test_deleted_targets_are_null(self):
+        Post.objects.filter(pk=self.posts[-1].id).delete()
+        post_type = ContentType.objects.get_for_model(Post).pk
+        targets = {row["object_id"]: row["target"] for row in self.bookmarks() if row["content_type"] == post_type}
+        self.assertIsNone(targets[self.posts[-1].id])
+        self.assertIsNotNone(targets[self.posts[0].id])
+
+
+class PostPageTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="fern", password="pw")
+        self.post = Post.objects.create(author=self.user, title="Page", content="x")
+        set_post_tags(self.post, ["django"], created=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/blog/posts/{self.post.id}/page/"
+
+    def add_threads(self, count):
+        for i in range(count):
+            root = Comment.objects.create(post=self.post, author=self.user, content=f"root {i}")
+            Comment.objects.create(post=self.post, author=self.user, content="reply", parent=root)
+            self.client.post(f"/blog/comments/{root.id}/like/")
+
+    def test_post_comments_and_viewer_state_in_one_response(self):
+        self.add_threads(2)
+        self.client.post(f"/blog/posts/{self.post.id}/like/")
+        page = self.client.get(self.url).json()
+        self.assertEqual(page["post"]["title"], "Page")
+        self.assertEqual((page["post"]["likes_count"], page["post"]["is_liked"]), (1, True))
+        self.assertEqual(page["comments"]["count"], 4)
+        liked = {row["content"]: row["is_liked"] for row in page["comments"]["results"]}
+        self.assertEqual(liked, {"root 0": True, "root 1": True, "reply": False})
+        self.assertEqual(page["comments"]["results"], self.client.get(f"/blog/posts/{self.post.id}/comments/").json()["results"])
+
+    def test_query_count_is_fixed(self):
+        # Post, tags, post viewer state, comment count, comment page,
+        # threads, comment viewer state.
+        for threads in (1, 8):
+            with self.subTest(threads=threads):
+                self.add_threads(threads)
+                with self.assertNumQueries(7):
+                    self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_anonymous_pages_are_cached_until_a_comment(self):
+        anonymous = APIClient()
+        self.assertEqual(anonymous.get(self.url)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            self.assertEqual(anonymous.get(self.url)["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/blog/posts/{self.post.id}/comments/", {"content": "new"})
+        self.assertEqual(anonymous.get(self.url).json()["comments"]["count"], 1)
+        self.assertEqual(anonymous.get("/blog/posts/999/page/").status_code, 404)
+
+    def test_every_pagination_counts_a_view(self):
+        for query in ("", "?pagination=cursor"):
+            with self.subTest(query=query):
+                before = view_counts.counter.pending_for(self.post.id)
+                self.client.get(self.url + query)
+                self.assertEqual(view_counts.counter.pending_for(self.post.id), before + 1)
@@ -0,0 +1,71 @@
+from django.db.models import Q
+
+from .models import Comment
+
+
+def subtree_filter(path):
+    """Lookup kwargs matching `path` and all of its descendants.
+
+    Written as a range rather than ``startswith`` so SQLite can answer it from
+    the (post, path) index: every descendant sorts between "<path>" and the
+    same prefix with its trailing "/" bumped to "0".
+    """
+    return {"path__gte": path, "path__lt": path[:-1] + "0"}
+
+
+def attach_replies(comments, extra=()):
+    """Link path-ordered `comments` into trees held in memory.
+
+    Every comment (and every instance in `extra`, which may be separate copies
+    of the same rows) gets a `_replies` list, in thread order. Returns the
+    comments whose parent is not part of the list.
+    """
+    children = {}
+    loaded = set()
+    roots = []
+    for comment in comments:
+        loaded.add(comment.pk)
+        children.setdefault(comment.parent_id, []).append(comment)
+        if comment.parent_id not in loaded:
+            roots.append(comment)
+    for comment in [*comments, *extra]:
+        comment._replies = children.get(comment.pk, [])
+    return roots
+
+
+def _subtree_nodes(comments):
+    """Path-ordered query for every comment in the subtrees of `comments`."""
+    # Drop comments already covered by an ancestor on the same page.
+    prefixes = []
+    for path in sorted(comment.path for comment in comments):
+        if not prefixes or not path.startswith(prefixes[-1]):
+            prefixes.append(path)
+
+    prefixes = set(prefixes)
+    covered = Q()
+    for comment in comments:
+        if comment.path in prefixes:
+            covered |= Q(post_id=comment.post_id, **subtree_filter(comment.path))
+    return Comment.objects.filter(covered).select_related("author").order_by("path")
+
+
+def load_threads(comments):
+    """Attach every descendant of `comments` with one ordered query."""
+    comments = list(comments)
+    if comments:
+        attach_replies(list(_subtree_nodes(comments)), extra=comments)
+    return comments
+
+
+async def aload_threads(comments):
+    """load_threads() for async views."""
+    comments = list(comments)
+    if comments:
+        attach_replies([node async for node in _subtree_nodes(comments)], extra=comments)
+    return comments
+
+
+def load_post_thread(post_id):
+    """Return the top-level comments of a post with all replies attached."""
+    nodes = list(Comment.objects.filter(post_id=post_id).select_related("author").order_by("path"))
+    return attach_replies(nodes)
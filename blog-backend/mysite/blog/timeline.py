@@ -0,0 +1,134 @@
+"""Materialized home timelines.
+
+Posts and reposts are pushed into each follower's TimelineEntry rows when they
+are written (fan-out on write). Authors with more than
+TIMELINE_FANOUT_MAX_FOLLOWERS followers are skipped on write; their activity is
+pulled into a reader's timeline when the reader opens its first page.
+
+Timelines are capped at TIMELINE_MAX_ENTRIES. Reading trims to the cap
+exactly; writing trims any timeline it has pushed more than
+TIMELINE_TRIM_SLACK entries past it, so followers who never read stay
+bounded without a trim per follower on every post.
+"""
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Engagement, Follow, Post, Repost, TimelineEntry
+
+BATCH_SIZE = 500
+
+
+def is_pull_author(user):
+    return user.followers_count > settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(post, actor, created_at, is_repost=False):
+    """Push `post` into the timelines of `actor` and, unless `actor` is a
+    pull author, of everyone following them."""
+    def entry(user_id):
+        return TimelineEntry(
+            user_id=user_id, post=post, actor=actor, is_repost=is_repost, created_at=created_at,
+        )
+
+    _insert([entry(actor.pk)])
+    trim_overgrown([actor.pk])
+    if is_pull_author(actor):
+        return
+    follower_ids = Follow.objects.filter(following=actor).values_list("follower_id", flat=True)
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=BATCH_SIZE):
+        batch.append(follower_id)
+        if len(batch) >= BATCH_SIZE:
+            _insert([entry(user_id) for user_id in batch])
+            trim_overgrown(batch)
+            batch = []
+    _insert([entry(user_id) for user_id in batch])
+    trim_overgrown(batch)
+
+
+def retract_repost(post, actor):
+    TimelineEntry.objects.filter(post=post, actor=actor, is_repost=True).delete()
+
+
+def backfill_follow(user, followed):
+    """Copy the latest posts of a newly followed author into `user`'s timeline."""
+    if is_pull_author(followed):
+        return  # pulled on read instead
+    posts = Post.objects.filter(author=followed).order_by("-created_at", "-id")
+    _insert([
+        TimelineEntry(user=user, post_id=post_id, actor=followed, created_at=created_at)
+        for post_id, created_at in posts.values_list("id", "created_at")[:settings.TIMELINE_FOLLOW_BACKFILL]
+    ])
+    trim_overgrown([user.pk])
+
+
+def forget_follow(user, followed):
+    TimelineEntry.objects.filter(user=user, actor=followed).delete()
+
+
+def pull_followed_authors(user):
+    """Materialize recent activity of followed pull authors into `user`'s timeline."""
+    pull_ids = list(
+        Follow.objects.filter(
+            follower=user, following__followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+        ).values_list("following_id", flat=True)
+    )
+    if not pull_ids:
+        return
+    since = TimelineEntry.objects.filter(user=user, actor_id__in=pull_ids).aggregate(t=Max("created_at"))["t"]
+    cap = settings.TIMELINE_MAX_ENTRIES
+
+    posts = Post.objects.filter(author_id__in=pull_ids)
+    reposts = Repost.objects.filter(
+        target_type=Engagement.TargetType.POST, user_id__in=pull_ids,
+        target_id__in=Post.objects.values("id"),
+    )
+    if since is not None:
+        posts = posts.filter(created_at__gt=since)
+        reposts = reposts.filter(created__gt=since)
+
+    entries = [
+        TimelineEntry(user=user, post_id=post_id, actor_id=author_id, created_at=created_at)
+        for post_id, author_id, created_at in
+        posts.order_by("-created_at").values_list("id", "author_id", "created_at")[:cap]
+    ]
+    entries += [
+        TimelineEntry(user=user, post_id=post_id, actor_id=user_id, is_repost=True, created_at=created)
+        for post_id, user_id, created in
+        reposts.order_by("-created").values_list("target_id", "user_id", "created")[:cap]
+    ]
+    _insert(entries)
+
+
+def trim(user):
+    """Drop everything older than the newest TIMELINE_MAX_ENTRIES entries."""
+    entries = TimelineEntry.objects.filter(user=user).order_by("-created_at", "-id")
+    boundary = list(entries.values_list("created_at", "id")[settings.TIMELINE_MAX_ENTRIES:][:1])
+    if boundary:
+        created_at, entry_id = boundary[0]
+        entries.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gt=entry_id).delete()
+
+
+def trim_overgrown(user_ids):
+    """Trim the timelines of `user_ids` that have grown more than
+    TIMELINE_TRIM_SLACK entries past the cap; one grouped count per call."""
+    if not user_ids:
+        return
+    limit = settings.TIMELINE_MAX_ENTRIES + settings.TIMELINE_TRIM_SLACK
+    overgrown = (
+        TimelineEntry.objects.filter(user_id__in=user_ids)
+        .values("user_id").annotate(entries=Count("id")).filter(entries__gt=limit)
+        .values_list("user_id", flat=True)
+    )
+    for user_id in list(overgrown):
+        trim(user_id)
+
+
+def refresh(user):
+    """Bring `user`'s timeline up to date before its first page is read."""
+    pull_followed_authors(user)
+    trim(user)
@@ -0,0 +1,163 @@
+"""Time-decayed trending scores for posts and tags.
+
+An event of weight w at time t contributes w * 2 ** -((now - t) / half_life)
+to a score. Factoring out the common decay, that equals a per-event term
+w * exp(rate * (t - EPOCH)) scaled by the same factor for every row, so
+ordering by the sum of the per-event terms is ordering by the decayed score.
+The sums are stored as logarithms (they overflow a float within a year
+otherwise), new events are folded in with logaddexp, and no stored score has
+to be rewritten as time passes.
+
+update_scores() reads only the source rows added since the last run (tracked
+per source in TrendingCursor); tag usage comes from the post/tag rows. Removed
+likes/reposts/bookmarks are not subtracted; they simply stop contributing as
+their weight decays.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Bookmark, Comment, Engagement, Like, Post, PostScore, Repost, TagScore, TrendingCursor
+
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+# Weight of one event of each kind in a post's score.
+POST_WEIGHTS = {
+    "post": 1.0,  # publishing seeds the score, so new posts can surface
+    "like": 1.0,
+    "bookmark": 1.5,
+    "comment": 2.0,
+    "repost": 3.0,
+}
+
+BATCH_SIZE = 5000
+
+
+def decay_rate():
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def log_term(weight, when):
+    return math.log(weight) + decay_rate() * (when - EPOCH).total_seconds()
+
+
+def current_score(score, now=None):
+    """A stored score converted to today's decayed weight."""
+    now = now or timezone.now()
+    return math.exp(score - decay_rate() * (now - EPOCH).total_seconds())
+
+
+def _logaddexp(a, b):
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _post_events():
+    """(source name, queryset, row -> (post id, created)) for each post event source."""
+    yield "post", Post.objects.only("id", "created_at"), lambda row: (row.pk, row.created_at)
+    yield "comment", Comment.objects.only("id", "post_id", "created_at"), lambda row: (row.post_id, row.created_at)
+    for name, model in (("like", Like), ("bookmark", Bookmark), ("repost", Repost)):
+        rows = model.objects.filter(target_type=Engagement.TargetType.POST).only("id", "target_id", "created")
+        yield name, rows, lambda row: (row.target_id, row.created)
+
+
+def _take(source, queryset, batch_size):
+    cursor, _ = TrendingCursor.objects.get_or_create(source=source)
+    rows = list(queryset.filter(pk__gt=cursor.last_id).order_by("pk")[:batch_size])
+    return cursor, rows
+
+
+def _fold(model, key, deltas):
+    """Add log-space `deltas` ({pk: term}) onto the stored scores of `model`."""
+    if not deltas:
+        return
+    existing = model.objects.in_bulk(list(deltas))
+    now = timezone.now()
+    updated, created = [], []
+    for pk, term in deltas.items():
+        row = existing.get(pk)
+        if row is None:
+            created.append(model(**{key: pk, "score": term}))
+        else:
+            row.score = _logaddexp(row.score, term)
+            row.updated_at = now  # bulk_update() skips auto_now
+            updated.append(row)
+    model.objects.bulk_create(created, batch_size=500)
+    model.objects.bulk_update(updated, ["score", "updated_at"], batch_size=500)
+
+
+def update_post_scores(batch_size=BATCH_SIZE):
+    """Fold new engagement into PostScore. Returns the number of events read."""
+    processed = 0
+    for source, queryset, extract in _post_events():
+        while True:
+            with transaction.atomic():
+                cursor, rows = _take(f"post:{source}", queryset, batch_size)
+                if not rows:
+                    break
+                deltas = defaultdict(lambda: None)
+                for row in rows:
+                    post_id, when = extract(row)
+                    deltas[post_id] = _logaddexp(deltas[post_id], log_term(POST_WEIGHTS[source], when))
+                # Engagement rows may point at deleted posts.
+                live = set(Post.objects.filter(pk__in=list(deltas)).values_list("pk", flat=True))
+                _fold(PostScore, "post_id", {pk: term for pk, term in deltas.items() if pk in live})
+                cursor.last_id = rows[-1].pk
+                cursor.save()
+            processed += len(rows)
+    return processed
+
+
+def update_tag_scores(batch_size=BATCH_SIZE):
+    """Fold newly applied tags into TagScore.
+
+    Reads the post/tag through table, so a tag added to an existing post
+    counts too. Its rows have no timestamp: each is dated by its post's
+    creation, or by the start of the previous run when that is later, since
+    a row past the cursor was written after that run began.
+    """
+    processed = 0
+    started = timezone.now()
+    PostTag = Post.tags.through
+    while True:
+        with transaction.atomic():
+            cursor, rows = _take("tag:posttag", PostTag.objects.only("id", "post_id", "tag_id"), batch_size)
+            if not rows:
+                break
+            created = dict(Post.objects.filter(pk__in={row.post_id for row in rows}).values_list("pk", "created_at"))
+            deltas = defaultdict(lambda: None)
+            for row in rows:
+                when = created[row.post_id]
+                if cursor.read_at is not None:
+                    when = max(when, cursor.read_at)
+                deltas[row.tag_id] = _logaddexp(deltas[row.tag_id], log_term(1.0, when))
+            _fold(TagScore, "tag_id", dict(deltas))
+            cursor.last_id = rows[-1].pk
+            cursor.save()
+        processed += len(rows)
+    TrendingCursor.objects.filter(source="tag:posttag").update(read_at=started)
+    return processed
+
+
+def prune(now=None):
+    """Delete scores that have decayed below a single event from
+    TRENDING_RETENTION_DAYS ago; they can never reach the top again."""
+    now = now or timezone.now()
+    cutoff = log_term(1.0, now - timedelta(days=settings.TRENDING_RETENTION_DAYS))
+    deleted = PostScore.objects.filter(score__lt=cutoff).delete()[0]
+    deleted += TagScore.objects.filter(score__lt=cutoff).delete()[0]
+    return deleted
+
+
+def update_scores(batch_size=BATCH_SIZE):
+    return {
+        "post_events": update_post_scores(batch_size),
+        "tag_events": update_tag_scores(batch_size),
+        "pruned": prune(),
+    }
@@ -1,26 +1,43 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Hot read endpoints: async views under ASGI (see blog.async_views).
+reads = async_views if settings.ASYNC_READ_VIEWS else views
 
 urlpatterns = [
     # Posts
-    path("posts/", views.post_list_create, name="post-list-create"),
-    path("posts/<int:pk>/", views.post_detail, name="post-detail"),
+    path("posts/", reads.post_list_create, name="post-list-create"),
+    path("posts/<int:pk>/", reads.post_detail, name="post-detail"),
+    path("posts/<int:pk>/page/", views.post_page, name="post-page"),
     path("posts/<int:pk>/like/", views.post_like, name="post-like"),
     path("posts/<int:pk>/bookmark/", views.post_bookmark, name="post-bookmark"),
     path("posts/<int:pk>/repost/", views.post_repost, name="post-repost"),
 
     # Comments
-    path("posts/<int:post_id>/comments/", views.comment_list_create, name="comment-list-create"),
+    path("posts/<int:post_id>/comments/", reads.comment_list_create, name="comment-list-create"),
     path("comments/<int:pk>/", views.comment_detail, name="comment-detail"),
     path("comments/<int:pk>/like/", views.comment_like, name="comment-like"),
     path("comments/<int:pk>/bookmark/", views.comment_bookmark, name="comment-bookmark"),
     path("comments/<int:pk>/repost/", views.comment_repost, name="comment-repost"),
 
     # Lists
-    path("likes/", views.like_list, name="like-list"),
-    path("bookmarks/", views.bookmark_list, name="bookmark-list"),
-    path("reposts/", views.repost_list, name="repost-list"),
+    path("likes/", reads.like_list, name="like-list"),
+    path("bookmarks/", reads.bookmark_list, name="bookmark-list"),
+    path("reposts/", reads.repost_list, name="repost-list"),
+    path("engagements/batch/", views.engagement_batch, name="engagement-batch"),
+
+
+    # Follows & timeline
+    path("users/<int:pk>/follow/", views.user_follow, name="user-follow"),
+    path("timeline/", views.home_timeline, name="home-timeline"),
+
+    # Trending
+    path("trending/posts/", views.trending_posts, name="trending-posts"),
+    path("trending/tags/", views.trending_tags, name="trending-tags"),
 
+    # Exports (admin only)
+    path("export/<str:kind>/", views.export, name="export"),
 
     # User Registration
     path("register/", views.signup, name="register"),
@@ -0,0 +1,183 @@
+"""Post view counts, coalesced in memory and written in batches.
+
+A view never writes to the database on the request path. record() adds one to
+an in-process counter split into shards keyed by thread, so concurrent
+requests rarely share a lock. A background thread drains every shard each
+VIEW_COUNT_FLUSH_INTERVAL seconds, or as soon as VIEW_COUNT_FLUSH_THRESHOLD
+views are pending, and adds the summed deltas to Post.views_count with a
+single UPDATE ... CASE statement. A flush that fails puts its deltas back, and
+whatever is pending when the process exits is flushed by an atexit hook.
+
+Counts are per process until flushed, so a worker that is killed outright
+loses at most one interval of views.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import BigIntegerField, Case, F, Value, When
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+SHARDS = 16
+UPDATE_CHUNK = 5000  # posts per UPDATE; keeps a flush under SQLite's variable limit
+
+
+class _Shard:
+    __slots__ = ("lock", "counts", "total")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.total = 0
+
+
+class ShardedCounter:
+    """Thread-safe Counter that only locks the calling thread's shard."""
+
+    def __init__(self, shards=SHARDS):
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def _shard(self):
+        return self._shards[threading.get_ident() % len(self._shards)]
+
+    def add(self, key, n=1):
+        """Add `n` to `key`; returns the number of increments now pending in
+        the calling thread's shard."""
+        shard = self._shard()
+        with shard.lock:
+            shard.counts[key] += n
+            shard.total += n
+            return shard.total
+
+    def update(self, deltas):
+        shard = self._shard()
+        with shard.lock:
+            shard.counts.update(deltas)
+            shard.total += sum(deltas.values())
+
+    def get(self, key):
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                total += shard.counts.get(key, 0)
+        return total
+
+    def drain(self):
+        """Remove and return everything counted so far, merged across shards."""
+        merged = Counter()
+        for shard in self._shards:
+            with shard.lock:
+                counts, shard.counts, shard.total = shard.counts, Counter(), 0
+            merged.update(counts)
+        return merged
+
+
+class ViewCounter:
+    def __init__(self):
+        self.pending = ShardedCounter()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def record(self, post_id):
+        self._ensure_flusher()
+        # Each shard holds roughly its share of the pending views.
+        if self.pending.add(post_id) * SHARDS >= settings.VIEW_COUNT_FLUSH_THRESHOLD:
+            self._wakeup.set()
+
+    def pending_for(self, post_id):
+        """Views of `post_id` counted by this process but not yet flushed."""
+        return self.pending.get(post_id)
+
+    def flush(self):
+        """Write all pending views; returns the number of posts updated."""
+        with self._flush_lock:
+            deltas = self.pending.drain()
+            if not deltas:
+                return 0
+            try:
+                ids = list(deltas)
+                for start in range(0, len(ids), UPDATE_CHUNK):
+                    chunk = ids[start:start + UPDATE_CHUNK]
+                    Post.objects.filter(pk__in=chunk).update(views_count=F("views_count") + Case(
+                        *(When(pk=pk, then=Value(deltas[pk])) for pk in chunk),
+                        output_field=BigIntegerField(),
+                    ))
+            except DatabaseError:
+                self.pending.update(deltas)  # try again on the next flush
+                raise
+            return len(deltas)
+
+    def _ensure_flusher(self):
+        # Started lazily so forked workers (gunicorn --preload) each run their own.
+        if self._pid == os.getpid() or not settings.VIEW_COUNT_FLUSH_INTERVAL:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="view-count-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(settings.VIEW_COUNT_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except DatabaseError:
+                logger.exception("Could not flush view counts; will retry")
+            finally:
+                close_old_connections()
+
+    def shutdown(self):
+        """Stop the flusher thread and write whatever is still pending."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except DatabaseError:
+            logger.exception("Could not flush view counts on shutdown")
+
+
+counter = ViewCounter()
+atexit.register(counter.shutdown)
+
+# A 304 is a reader reopening the post, so it counts like a full response.
+COUNTED_STATUSES = (200, 304)
+
+
+def counts_view(view):
+    """Record a view of post `pk` for each GET answered with the post.
+
+    Goes outside the conditional-GET handling, so revalidations that end in a
+    304 before the view runs are counted too. Works on sync and async views.
+    """
+    def count(request, response, pk):
+        if request.method == "GET" and response.status_code in COUNTED_STATUSES:
+            counter.record(pk)  # in memory only; safe on the event loop
+        return response
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, pk, *args, **kwargs):
+            return count(request, await view(request, pk, *args, **kwargs), pk)
+    else:
+        @wraps(view)
+        def wrapper(request, pk, *args, **kwargs):
+            return count(request, view(request, pk, *args, **kwargs), pk)
+    return wrapper
@@ -1,20 +1,38 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from django.contrib.contenttypes.models import ContentType
-from rest_framework.permissions import AllowAny
-
-from .models import Post, Comment, Like, Bookmark, Repost
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.text import compress_sequence
+from django.db import transaction
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+from rest_framework.permissions import AllowAny, IsAdminUser
+
+from .models import User, Post, Comment, Like, Bookmark, Repost, Follow, TimelineEntry, PostScore, TagScore
+from .authentication import ClaimsJWTAuthentication, invalidate_user
+from .counters import adjust_counter
+from .threads import load_threads, subtree_filter
+from .search import search_posts, attach_snippets
+from .pagination import StandardResultsSetPagination, KeysetPagination, get_paginator
+from .fieldsets import only_requested
+from . import engagement, etags, export as exports, response_cache, timeline, view_counts
 from .serializers import (
     PostSerializer, CommentSerializer,
-    LikeSerializer, BookmarkSerializer, RepostSerializer, UserSerializer
+    LikeSerializer, BookmarkSerializer, RepostSerializer, UserSerializer,
+    TimelineEntrySerializer, EngagementOperationSerializer,
+    TrendingPostSerializer, TrendingTagSerializer,
 )
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from django.contrib.auth import authenticate
 
+MAX_BATCH_OPERATIONS = 100  # per engagement_batch request
+# Read by pagination and blog.threads whatever the fieldset.
+COMMENT_THREAD_COLUMNS = ["post", "parent", "path", "depth", "created_at"]
 
 
 
@@ -22,62 +40,92 @@ from django.contrib.auth import authenticate
 
 
 
-from rest_framework.pagination import PageNumberPagination
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10  # default page size
-    page_size_query_param = 'page_size'  # allow client to override ?page_size=5
-    max_page_size = 100
 
 
 #################################################
 # POSTS
 #################################################
-@api_view(["GET", "POST"])
-@permission_classes([IsAuthenticatedOrReadOnly])
-def post_list_create(request):
-    if request.method == "GET":
-        posts = Post.objects.all().select_related("author")
+def _post_list_page(request):
+    # Counters are stored on the row and tags are prefetched for the whole
+    # page, so serializing a page costs the same few queries at any size.
+    posts = Post.objects.all().select_related("author").prefetch_related("tags")
+
+    # --- Filtering ---
+    author = request.query_params.get("author")
+    search = request.query_params.get("search")
 
-        # --- Filtering ---
-        author = request.query_params.get("author")
-        search = request.query_params.get("search")
+    if author:
+        posts = posts.filter(author__id=author)
+    if search:
+        posts = search_posts(posts, search)
 
-        if author:
-            posts = posts.filter(author__id=author)
-        if search:
-            posts = posts.filter(title__icontains=search) | posts.filter(content__icontains=search)
+    # Only the columns this request's fieldset shows.
+    context = {"request": request}
+    posts = only_requested(posts, PostSerializer, context, extra=["created_at"])
 
-        # --- Pagination ---
+    # --- Pagination ---
+    # Search results are ordered by relevance, so they stay page-numbered.
+    if search:
         paginator = StandardResultsSetPagination()
-        paginated_posts = paginator.paginate_queryset(posts, request)
-        serializer = PostSerializer(paginated_posts, many=True)
-        return paginator.get_paginated_response(serializer.data)
+    else:
+        paginator = get_paginator(request, ordering=("-created_at", "-id"))
+    paginated_posts = paginator.paginate_queryset(posts, request)
+    if search:
+        paginated_posts = attach_snippets(paginated_posts, search)
+    serializer = PostSerializer(paginated_posts, many=True, context=context)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@vary_on_headers("Authorization")
+@condition(etag_func=etags.post_list_etag)
+@api_view(["GET", "POST"])
+@authentication_classes([ClaimsJWTAuthentication])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def post_list_create(request):
+    if request.method == "GET":
+        if not response_cache.is_cached_list_page(request):
+            return _post_list_page(request)
+        return response_cache.cached_response(
+            request, "post-list", [response_cache.POSTS_SCOPE], lambda: _post_list_page(request).data,
+        )
 
     if request.method == "POST":
         print(request.data)
-        serializer = PostSerializer(data=request.data)
+        serializer = PostSerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
-            serializer.save(author=request.user)
+            post = serializer.save(author=request.user)
+            timeline.fan_out(post, request.user, post.created_at)
+            response_cache.invalidate_lists()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     
+@view_counts.counts_view
+@vary_on_headers("Authorization")
+@condition(etag_func=etags.post_detail_etag)
 @api_view(["GET", "PUT", "DELETE"])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticatedOrReadOnly])
 def post_detail(request, pk):
-    post = get_object_or_404(Post, pk=pk)
+    posts = Post.objects.select_related("author").prefetch_related("tags")
 
     if request.method == "GET":
-        serializer = PostSerializer(post)
-        return Response(serializer.data)
+        response = response_cache.cached_response(
+            request, "post-detail", [response_cache.post_scope(pk)],
+            lambda: PostSerializer(get_object_or_404(posts, pk=pk), context={"request": request}).data,
+        )
+        return response
+
+    post = get_object_or_404(posts, pk=pk)
 
     if request.method == "PUT":
         if post.author != request.user:
             return Response({"detail": "Not allowed"}, status=403)
-        serializer = PostSerializer(post, data=request.data, partial=True)
+        serializer = PostSerializer(post, data=request.data, partial=True, context={"request": request})
         if serializer.is_valid():
             serializer.save()
+            response_cache.invalidate_post(post.id)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
@@ -85,111 +133,175 @@ def post_detail(request, pk):
         if post.author != request.user:
             return Response({"detail": "Not allowed"}, status=403)
         post.delete()
+        response_cache.invalidate_post(pk)
         return Response(status=204)
     
 
+@view_counts.counts_view
+@vary_on_headers("Authorization")
+@api_view(["GET"])
+@authentication_classes([ClaimsJWTAuthentication])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def post_page(request, pk):
+    """What opening a post needs, in one response: the post with its counters
+    and viewer state, and the first page of its comment threads with theirs.
+    Comment query parameters (page, page_size, author...) apply to the
+    comments. Anonymous responses are cached like post_detail's."""
+    def build():
+        post = get_object_or_404(Post.objects.select_related("author").prefetch_related("tags"), pk=pk)
+        return {
+            "post": PostSerializer(post, context={"request": request}).data,
+            "comments": _comment_page(request, pk).data,
+        }
+
+    if not response_cache.is_cached_list_page(request):
+        return Response(build())
+    return response_cache.cached_response(request, "post-page", [response_cache.post_scope(pk)], build)
+
+
 # -----------------------------
 # POST ACTIONS: like, bookmark, repost
 # -----------------------------
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def post_like(request, pk):
+def _toggle_post(request, pk, action, serializer_class, removed_detail):
     post = get_object_or_404(Post, pk=pk)
-    ct = ContentType.objects.get_for_model(Post)
-    like, created = Like.objects.get_or_create(user=request.user, content_type=ct, object_id=post.id)
-    if not created:
-        like.delete()
-        return Response({"detail": "Unliked"}, status=200)
-    return Response({ "detail": LikeSerializer(like).data})
-
+    state = engagement.get_row(request.user, action, "post", post.id) is None
+    engagement.set_state(request.user, action, "post", post.id, state)
+    if not state:
+        return Response({"detail": removed_detail}, status=200)
+    row = engagement.get_row(request.user, action, "post", post.id)
+    return Response({"detail": serializer_class(row).data})
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def post_like(request, pk):
+    return _toggle_post(request, pk, "like", LikeSerializer, "Unliked")
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def post_bookmark(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    ct = ContentType.objects.get_for_model(Post)
-    bm, created = Bookmark.objects.get_or_create(user=request.user, content_type=ct, object_id=post.id)
-    if not created:
-        bm.delete()
-        return Response({"detail": "Bookmark removed"}, status=200)
-    return Response({"detail": BookmarkSerializer(bm).data})
+    return _toggle_post(request, pk, "bookmark", BookmarkSerializer, "Bookmark removed")
+
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def post_repost(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    ct = ContentType.objects.get_for_model(Post)
-    repost, created = Repost.objects.get_or_create(user=request.user, content_type=ct, object_id=post.id)
-    if not created:
-        repost.delete()
-        return Response({"detail": "Repost removed"}, status=200)
-    return Response({"detail": RepostSerializer(repost).data})
+    return _toggle_post(request, pk, "repost", RepostSerializer, "Repost removed")
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def engagement_batch(request):
+    operations = request.data.get("operations") if isinstance(request.data, dict) else request.data
+    serializer = EngagementOperationSerializer(data=operations, many=True)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    if len(serializer.validated_data) > MAX_BATCH_OPERATIONS:
+        return Response({"detail": f"At most {MAX_BATCH_OPERATIONS} operations per request"}, status=400)
 
+    ops = [
+        (op["action"], op["target_type"], op["target_id"], op["state"])
+        for op in serializer.validated_data
+    ]
+    try:
+        results = engagement.set_states(request.user, ops)
+    except engagement.UnknownTargets as exc:
+        missing = [{"target_type": t, "target_id": pk} for t, pk in exc.missing]
+        return Response({"detail": "Unknown targets", "missing": missing}, status=404)
+
+    return Response({"results": [
+        {"action": action, "target_type": target_type, "target_id": target_id, "state": state, "count": count}
+        for (action, target_type, target_id), (state, count) in results.items()
+    ]})
 
 
 
 
 ############## COMMENTS #####################
 
+@vary_on_headers("Authorization")
+@condition(etag_func=etags.comment_list_etag)
 @api_view(["GET", "POST"])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticatedOrReadOnly])
 def comment_list_create(request, post_id):
     if request.method == "GET":
-        comments = Comment.objects.filter(post_id=post_id).select_related("author", "parent")
-
-        # --- Filtering ---
-        author = request.query_params.get("author")
-        if author:
-            comments = comments.filter(author__id=author)
-
-        # --- Pagination ---
-        paginator = StandardResultsSetPagination()
-        paginated_comments = paginator.paginate_queryset(comments, request)
-        serializer = CommentSerializer(paginated_comments, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return _comment_page(request, post_id)
 
     if request.method == "POST":
         parent_id = request.data.get("parent")
-        serializer = CommentSerializer(data=request.data)
+        serializer = CommentSerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
             parent = Comment.objects.filter(id=parent_id).first() if parent_id else None
-            serializer.save(author=request.user, post_id=post_id, parent=parent)
+            with transaction.atomic():
+                serializer.save(author=request.user, post_id=post_id, parent=parent)
+                adjust_counter(Post, post_id, "comments_count", 1)
+                response_cache.invalidate_post(post_id)
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
     
+def _comment_page(request, post_id):
+    """The paginated response of one page of a post's comments, reply
+    threads attached."""
+    comments = Comment.objects.filter(post_id=post_id).select_related("author", "parent")
+
+    # --- Filtering ---
+    author = request.query_params.get("author")
+    if author:
+        comments = comments.filter(author__id=author)
+    context = {"request": request}
+    comments = only_requested(comments, CommentSerializer, context, extra=COMMENT_THREAD_COLUMNS)
+
+    # --- Pagination ---
+    paginator = get_paginator(request, ordering=("created_at", "id"))
+    paginated_comments = load_threads(paginator.paginate_queryset(comments, request))
+    serializer = CommentSerializer(paginated_comments, many=True, context=context)
+    return paginator.get_paginated_response(serializer.data)
+
+
+def _subtree_size(comment):
+    """Number of comments removed when `comment` is deleted (replies cascade)."""
+    return Comment.objects.filter(post_id=comment.post_id, **subtree_filter(comment.path)).count()
+
+
+@vary_on_headers("Authorization")
+@condition(etag_func=etags.comment_detail_etag)
 @api_view(["GET", "PUT", "DELETE"])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticatedOrReadOnly])
 def comment_detail(request, pk):
-    comment = get_object_or_404(Comment, pk=pk)
+    comment = get_object_or_404(Comment.objects.select_related("author"), pk=pk)
 
     if request.method == "GET":
-        serializer = CommentSerializer(comment)
+        serializer = CommentSerializer(comment, context={"request": request})
         return Response(serializer.data)
 
     if request.method == "PUT":
         if comment.author != request.user:
             return Response({"detail": "Not allowed"}, status=403)
-        serializer = CommentSerializer(comment, data=request.data, partial=True)
+        serializer = CommentSerializer(comment, data=request.data, partial=True, context={"request": request})
         if serializer.is_valid():
             serializer.save()
+            response_cache.invalidate_post(comment.post_id)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
     if request.method == "DELETE":
         if comment.author != request.user:
             return Response({"detail": "Not allowed"}, status=403)
-        comment.delete()
+        with transaction.atomic():
+            removed = _subtree_size(comment)
+            comment.delete()
+            adjust_counter(Post, comment.post_id, "comments_count", -removed)
+            response_cache.invalidate_post(comment.post_id)
         return Response(status=204)
     
 
 
 
 @api_view(["GET"])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticatedOrReadOnly])
 def like_list(request):
     likes = Like.objects.all().select_related("user")
@@ -202,17 +314,19 @@ def like_list(request):
     if user:
         likes = likes.filter(user__id=user)
     if content_type and object_id:
-        ct = ContentType.objects.get(model=content_type)
-        likes = likes.filter(content_type=ct, object_id=object_id)
+        likes = engagement.of_target(likes, content_type, object_id)
 
     # --- Pagination ---
-    paginator = StandardResultsSetPagination()
+    context = {"request": request}
+    likes = only_requested(likes, LikeSerializer, context, extra=["created"])
+    paginator = get_paginator(request, ordering=("-created", "-id"))
     paginated = paginator.paginate_queryset(likes, request)
-    serializer = LikeSerializer(paginated, many=True)
+    serializer = LikeSerializer(paginated, many=True, context=context)
     return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(["GET"])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticatedOrReadOnly])
 def bookmark_list(request):
     bookmarks = Bookmark.objects.all().select_related("user")
@@ -222,13 +336,16 @@ def bookmark_list(request):
     if user:
         bookmarks = bookmarks.filter(user__id=user)
 
-    paginator = StandardResultsSetPagination()
+    context = {"request": request}
+    bookmarks = only_requested(bookmarks, BookmarkSerializer, context, extra=["created"])
+    paginator = get_paginator(request, ordering=("-created", "-id"))
     paginated = paginator.paginate_queryset(bookmarks, request)
-    serializer = BookmarkSerializer(paginated, many=True)
+    serializer = BookmarkSerializer(paginated, many=True, context=context)
     return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(["GET"])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticatedOrReadOnly])
 def repost_list(request):
     reposts = Repost.objects.all().select_related("user")
@@ -238,9 +355,11 @@ def repost_list(request):
     if user:
         reposts = reposts.filter(user__id=user)
 
-    paginator = StandardResultsSetPagination()
+    context = {"request": request}
+    reposts = only_requested(reposts, RepostSerializer, context, extra=["created"])
+    paginator = get_paginator(request, ordering=("-created", "-id"))
     paginated = paginator.paginate_queryset(reposts, request)
-    serializer = RepostSerializer(paginated, many=True)
+    serializer = RepostSerializer(paginated, many=True, context=context)
     return paginator.get_paginated_response(serializer.data)
 
 
@@ -248,41 +367,143 @@ def repost_list(request):
 # -----------------------------
 # COMMENT ACTIONS: like, bookmark, repost
 # -----------------------------
+def _engage_comment(request, pk, action, serializer_class, existing_detail):
+    comment = get_object_or_404(Comment, pk=pk)
+    if engagement.get_row(request.user, action, "comment", comment.id) is not None:
+        return Response({"detail": existing_detail}, status=400)
+    engagement.set_state(request.user, action, "comment", comment.id, True)
+    row = engagement.get_row(request.user, action, "comment", comment.id)
+    return Response(serializer_class(row).data)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def comment_like(request, pk):
-    comment = get_object_or_404(Comment, pk=pk)
-    ct = ContentType.objects.get_for_model(Comment)
-    like, created = Like.objects.get_or_create(user=request.user, content_type=ct, object_id=comment.id)
-    if not created:
-        return Response({"detail": "Already liked"}, status=400)
-    return Response(LikeSerializer(like).data)
-
+    return _engage_comment(request, pk, "like", LikeSerializer, "Already liked")
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def comment_bookmark(request, pk):
-    comment = get_object_or_404(Comment, pk=pk)
-    ct = ContentType.objects.get_for_model(Comment)
-    bm, created = Bookmark.objects.get_or_create(user=request.user, content_type=ct, object_id=comment.id)
-    if not created:
-        return Response({"detail": "Already bookmarked"}, status=400)
-    return Response(BookmarkSerializer(bm).data)
+    return _engage_comment(request, pk, "bookmark", BookmarkSerializer, "Already bookmarked")
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def comment_repost(request, pk):
-    comment = get_object_or_404(Comment, pk=pk)
-    ct = ContentType.objects.get_for_model(Comment)
-    repost, created = Repost.objects.get_or_create(user=request.user, content_type=ct, object_id=comment.id)
-    if not created:
-        return Response({"detail": "Already reposted"}, status=400)
-    return Response(RepostSerializer(repost).data)
+    return _engage_comment(request, pk, "repost", RepostSerializer, "Already reposted")
+
+
+
+
+#################################################
+# FOLLOWS & TIMELINE
+#################################################
+@api_view(["POST", "DELETE"])
+@permission_classes([IsAuthenticated])
+def user_follow(request, pk):
+    target = get_object_or_404(User, pk=pk)
+    if target == request.user:
+        return Response({"detail": "You cannot follow yourself"}, status=400)
+
+    if request.method == "POST":
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(follower=request.user, following=target)
+            if not created:
+                return Response({"detail": "Already following"}, status=400)
+            adjust_counter(User, target.id, "followers_count", 1)
+            adjust_counter(User, request.user.id, "following_count", 1)
+            invalidate_user(target.id)
+            invalidate_user(request.user.id)
+            timeline.backfill_follow(request.user, target)
+        return Response({"detail": "Followed"}, status=201)
 
+    if request.method == "DELETE":
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower=request.user, following=target).delete()
+            if not deleted:
+                return Response({"detail": "Not following"}, status=400)
+            adjust_counter(User, target.id, "followers_count", -1)
+            adjust_counter(User, request.user.id, "following_count", -1)
+            invalidate_user(target.id)
+            invalidate_user(request.user.id)
+            timeline.forget_follow(request.user, target)
+        return Response(status=204)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def home_timeline(request):
+    paginator = KeysetPagination(ordering=("-created_at", "-id"))
+    if not request.query_params.get(paginator.cursor_query_param):
+        timeline.refresh(request.user)
+
+    entries = (
+        TimelineEntry.objects.filter(user=request.user)
+        .select_related("post__author")
+        .prefetch_related("post__tags")
+    )
+    paginated = paginator.paginate_queryset(entries, request)
+    serializer = TimelineEntrySerializer(paginated, many=True, context={"request": request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+#################################################
+# TRENDING
+#################################################
+@api_view(["GET"])
+@authentication_classes([ClaimsJWTAuthentication])
+@permission_classes([AllowAny])
+def trending_posts(request):
+    scores = PostScore.objects.select_related("post__author").prefetch_related("post__tags").order_by("-score")
+    paginator = StandardResultsSetPagination()
+    paginated = paginator.paginate_queryset(scores, request)
+    serializer = TrendingPostSerializer(paginated, many=True, context={"request": request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def trending_tags(request):
+    scores = TagScore.objects.select_related("tag").order_by("-score")
+    paginator = StandardResultsSetPagination()
+    paginated = paginator.paginate_queryset(scores, request)
+    serializer = TrendingTagSerializer(paginated, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+#################################################
+# EXPORT
+#################################################
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def export(request, kind):
+    """Stream a whole table as NDJSON; see blog.export for the watermarks."""
+    if kind not in exports.EXPORTS:
+        return Response({"detail": f"Unknown export; choose from {', '.join(exports.EXPORTS)}"}, status=404)
+
+    since = request.query_params.get("since")
+    since_id = request.query_params.get("since_id")
+    if since is not None:
+        since = parse_datetime(since)
+        if since is None:
+            return Response({"detail": "since must be an ISO 8601 datetime"}, status=400)
+    if since_id is not None:
+        if not since_id.isdigit():
+            return Response({"detail": "since_id must be an integer"}, status=400)
+        since_id = int(since_id)
+
+    lines = exports.ndjson(kind, since=since, since_id=since_id)
+    gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    response = StreamingHttpResponse(
+        compress_sequence(lines) if gzip else lines, content_type="application/x-ndjson",
+    )
+    if gzip:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    response["Content-Disposition"] = f'attachment; filename="{kind}.ndjson"'
+    return response
+
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from datetime import timedelta
 from pathlib import Path
 
@@ -46,7 +47,11 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'blog.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'blog.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
@@ -70,13 +75,22 @@ SIMPLE_JWT = {
 }
 
 
+# Home timelines (blog.timeline)
+TIMELINE_MAX_ENTRIES = 800  # per-user cap; older entries are trimmed on read
+TIMELINE_TRIM_SLACK = 100  # entries a write may add past the cap before it trims
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10_000  # above this, followers pull the author's posts at read time
+TIMELINE_FOLLOW_BACKFILL = 50  # recent posts copied in when following someone
+
+
 MIDDLEWARE = [
+    'blog.metrics.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'blog.routers.PrimaryPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -107,16 +121,112 @@ AUTHENTICATION_BACKENDS = [
 
 WSGI_APPLICATION = 'mysite.wsgi.application'
 
+# Serve the hot GET endpoints with the async views in blog.async_views.
+# mysite/asgi.py turns this on; under WSGI they would only add overhead.
+ASYNC_READ_VIEWS = os.environ.get('BLOG_ASYNC_READ_VIEWS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# "replica" serves reads (blog.routers). It defaults to a read-only connection
+# to the primary file, which under WAL never waits on a writer; point
+# BLOG_REPLICA_DB at a replicated copy to take reads off the primary entirely.
+DATABASE_PATH = BASE_DIR / 'db.sqlite3'
+CONN_MAX_AGE = int(os.environ.get('BLOG_CONN_MAX_AGE', 60))  # seconds; 0 closes after every request
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': DATABASE_PATH,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN, so a transaction that reads first
+            # never fails on upgrading its lock; it waits busy_timeout instead.
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{os.environ.get('BLOG_REPLICA_DB', DATABASE_PATH)}?mode=ro",
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['blog.routers.PrimaryReplicaRouter']
+# A user's reads stay on the primary this long after they write. The pin is
+# kept in the default cache, so only workers sharing it (SHARED_CACHE) see it.
+REPLICA_PIN_SECONDS = 5
+
+# Applied to every SQLite connection (blog.sqlite)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,  # ms
+}
+
+
+# Trending scores (blog.trending)
+TRENDING_HALF_LIFE_HOURS = 12  # engagement loses half its weight every 12 hours
+TRENDING_RETENTION_DAYS = 7  # scores untouched for this long are pruned
+
+# Post view counts (blog.view_counts)
+VIEW_COUNT_FLUSH_INTERVAL = 5  # seconds between batched writes; None disables the flusher thread
+VIEW_COUNT_FLUSH_THRESHOLD = 1000  # pending views that trigger an early flush
+
+
+# NDJSON exports (blog.export)
+EXPORT_CHUNK_SIZE = 2000  # rows fetched and written per chunk
+
+# Request metrics (blog.metrics), served at /metrics
+SLOW_REQUEST_MS = 500  # requests at least this slow are logged; None disables the log
+SLOW_REQUEST_TOP_QUERIES = 5  # slowest queries kept per request for that log
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # None lets anyone scrape /metrics
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Pick the backend with BLOG_CACHE_BACKEND; "database" needs `manage.py createcachetable`.
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+    'database': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'blog_cache',
+    },
+}
+
+BLOG_CACHE_BACKEND = os.environ.get('BLOG_CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': CACHE_BACKENDS[BLOG_CACHE_BACKEND],
 }
+# locmem lives inside each process; the other backends are seen by every worker.
+SHARED_CACHE = BLOG_CACHE_BACKEND != 'locmem'
+
+# Response cache for hot GET endpoints (blog.response_cache). Invalidation only
+# reaches other workers through a shared cache (SHARED_CACHE).
+RESPONSE_CACHE_TIMEOUT = 60  # seconds before an entry is rebuilt
+RESPONSE_CACHE_MAX_PAGE = 3  # list pages beyond this are never cached
+
+# Authenticated-user cache for JWT requests (blog.authentication)
+# CACHES alias shared by every process; None keeps only the local LRU. A
+# per-process alias would keep serving a saved user to the other workers.
+JWT_USER_CACHE = 'default' if SHARED_CACHE else None
+JWT_USER_CACHE_TIMEOUT = 60  # seconds a user stays in the shared cache
+JWT_USER_LOCAL_CACHE_SIZE = 1024  # users kept per process; 0 disables the local LRU
+JWT_USER_LOCAL_CACHE_TIMEOUT = 5  # seconds, which bounds how stale another process's copy can be
+JWT_CLAIMS_USER_ON_READS = True  # reads on ClaimsJWTAuthentication endpoints get a read-only claims user
 
 
 # Password validation
@@ -21,10 +21,13 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from blog.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('blog/', include('blog.urls')),
     path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
+    path('metrics', metrics_view, name='metrics'),
 ]